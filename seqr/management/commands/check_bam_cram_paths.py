@@ -1,12 +1,11 @@
 from django.core.management.base import BaseCommand
 
 import collections
-import hail as hl
 import logging
-import tqdm
 
 from seqr.models import IgvSample
 from seqr.utils import communication_utils
+from seqr.utils.file_utils import does_files_exist
 from settings import SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL
 
 logger = logging.getLogger(__name__)
@@ -31,13 +30,18 @@ class Command(BaseCommand):
             individual__family__project__name__in=args
         ) if args else IgvSample.objects.all()).filter(
             file_path__startswith='gs://'
-        ).prefetch_related('individual', 'individual__family__project')
+        ).select_related('individual__family__project').only(
+            'guid', 'file_path', 'individual__individual_id', 'individual__family__project__name',
+        )
+
+        samples = list(samples)
+        file_exists = does_files_exist(list({sample.file_path for sample in samples}), show_progress=True)
 
         missing_counter = collections.defaultdict(int)
         guids_of_samples_with_missing_file = set()
         project_name_to_missing_paths = collections.defaultdict(list)
-        for sample in tqdm.tqdm(samples, unit=" samples"):
-            if not hl.hadoop_is_file(sample.file_path):
+        for sample in samples:
+            if not file_exists[sample.file_path]:
                 individual_id = sample.individual.individual_id
                 project_name = sample.individual.family.project.name
                 missing_counter[project_name] += 1
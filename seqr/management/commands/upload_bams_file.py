@@ -1,24 +1,28 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
 from seqr.models import IgvSample, Individual, Project
 from seqr.views.utils.file_utils import parse_file
 from collections import defaultdict
-from seqr.views.utils.json_to_orm_utils import get_or_create_model_from_json
 from seqr.views.utils.permissions_utils import get_project_and_check_permissions
-from seqr.utils.file_utils import does_file_exist
+from seqr.utils.file_utils import does_files_exist
+from seqr.utils.logging_utils import SeqrLogger, log_model_bulk_update
 from seqr.views.apis.igv_api import SAMPLE_TYPE_MAP
 import sys
 
+logger = SeqrLogger(__name__)
+
 
 def process_alignment_records_via_command(rows):
-    invalid_row = next((row for row in rows if not 2 <= len(row) <= 3), None)
-    if invalid_row:
-        raise ValueError("Must contain 2 or 3 columns: " +
-                         ', '.join(invalid_row))
     parsed_records = defaultdict(list)
     for row in rows:
+        num_columns = len(row)
+        if not 2 <= num_columns <= 3:
+            raise ValueError("Must contain 2 or 3 columns: " +
+                             ', '.join(row))
         parsed_records[row[0]].append(
-            {'filePath': row[1], 'sampleId': row[2] if len(row) > 2 else None})
+            {'filePath': row[1], 'sampleId': row[2] if num_columns > 2 else None})
     return parsed_records
 
 
@@ -41,30 +45,27 @@ class Command(BaseCommand):
         try:
             with open(filename, 'r') as input:
                 list_of_lists = parse_file(filename, input)
-            print(list_of_lists)
             # format of individual_dataset_mapping:
             # {individual_id: [{'filePath': filePath, 'sampleId': None}]}
             individual_dataset_mapping = process_alignment_records_via_command(
                 list_of_lists)
-            # print(individual_dataset_mapping)
 
-            matched_individuals = Individual.objects.filter(
-                family__project=project, individual_id__in=individual_dataset_mapping.keys())
-            # print(matched_individuals)
+            matched_individuals = list(Individual.objects.filter(
+                family__project=project, individual_id__in=individual_dataset_mapping.keys()
+            ).only('guid', 'individual_id'))
             unmatched_individuals = set(individual_dataset_mapping.keys(
             )) - {i.individual_id for i in matched_individuals}
             if len(unmatched_individuals) > 0:
                 raise Exception('The following Individual IDs do not exist: {}'.format(
                     ", ".join(unmatched_individuals)))
 
+            existing_samples = list(IgvSample.objects.select_related('individual').filter(
+                individual__in=matched_individuals))
             existing_sample_files = defaultdict(set)
-            for sample in IgvSample.objects.select_related('individual').filter(individual__in=matched_individuals):
+            for sample in existing_samples:
                 existing_sample_files[sample.individual.individual_id].add(
                     sample.file_path)
 
-            # print('existing_sample_files')
-            # print(existing_sample_files)
-
             unchanged_rows = set()
             for individual_id, updates in individual_dataset_mapping.items():
                 unchanged_rows.update([
@@ -73,37 +74,60 @@ class Command(BaseCommand):
                 ])
 
             if unchanged_rows:
-                print('No change detected for {} rows'.format(len(unchanged_rows)))
+                logger.info('No change detected for {} rows'.format(len(unchanged_rows)), user)
 
             all_updates = []
             for i in matched_individuals:
                 all_updates += [
-                    dict(individualGuid=i.guid, **update) for update in individual_dataset_mapping[i.individual_id]
+                    (i, update) for update in individual_dataset_mapping[i.individual_id]
                     if (i.individual_id, update['filePath']) not in unchanged_rows
                 ]
 
-            # print(all_updates)
-            
-            for record in all_updates:
-                individual = Individual.objects.get(
-                    guid=record.get('individualGuid'))
+            file_paths = {
+                record['filePath'] for _, record in all_updates
+                if any(record['filePath'].endswith(suffix) for suffix, _ in SAMPLE_TYPE_MAP)
+            }
+            file_exists = does_files_exist(list(file_paths), user=user)
+
+            existing_samples_by_key = {
+                (sample.individual_id, sample.sample_type): sample for sample in existing_samples}
+            new_samples = {}
+            updated_samples = {}
+            now = timezone.now()
+            for individual, record in all_updates:
                 file_path = record.get('filePath')
                 sample_id = record.get('sampleId')
                 sample_type = next(
                     (st for suffix, st in SAMPLE_TYPE_MAP if file_path.endswith(suffix)), None)
 
                 if not sample_type:
-                    print('Invalid file extension for "{}" - valid extensions are {}'.format(
-                        file_path, ', '.join([suffix for suffix, _ in SAMPLE_TYPE_MAP])))
+                    logger.error('Invalid file extension for "{}" - valid extensions are {}'.format(
+                        file_path, ', '.join([suffix for suffix, _ in SAMPLE_TYPE_MAP])), user)
                     continue
-                if not does_file_exist(file_path, user=user):
-                    print('Error accessing "{}"'.format(file_path))
+                if not file_exists[file_path]:
+                    logger.error('Error accessing "{}"'.format(file_path), user)
                     continue
-                
-                sample, created = get_or_create_model_from_json(IgvSample, create_json={'individual': individual, 'sample_type': sample_type},  update_json={
-                                                                'file_path': file_path, 'sample_id': sample_id}, user=user)
-                print(sample, created)
+
+                key = (individual.id, sample_type)
+                sample = existing_samples_by_key.get(key)
+                if sample:
+                    sample.file_path = file_path
+                    sample.sample_id = sample_id
+                    sample.last_modified_date = now
+                    updated_samples[key] = sample
+                else:
+                    new_samples[key] = IgvSample(
+                        individual=individual, sample_type=sample_type, file_path=file_path, sample_id=sample_id,
+                        last_modified_date=now)
+
+            with transaction.atomic():
+                IgvSample.bulk_create(user, list(new_samples.values()))
+                IgvSample.objects.bulk_update(
+                    list(updated_samples.values()), ['file_path', 'sample_id', 'last_modified_date'])
+            log_model_bulk_update(logger, list(updated_samples.values()), user, 'update',
+                                  update_fields=['file_path', 'sample_id'])
+            logger.info('Created {} and updated {} IGV samples'.format(len(new_samples), len(updated_samples)), user)
 
         except Exception as e:
-            print(e)
+            logger.error(str(e), user)
 
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
-from seqr.models import Sample, Individual, Family
+from seqr.models import Sample, Family
 from seqr.views.utils.permissions_utils import get_project_and_check_permissions, is_internal_anvil_project, project_has_anvil
 from seqr.views.utils.orm_to_json_utils import get_json_for_samples
 from seqr.views.utils.json_utils import create_json_response
@@ -9,6 +9,7 @@ from seqr.views.utils.dataset_utils import match_and_update_samples, load_mappin
 from seqr.utils.communication_utils import send_html_email, safe_post_to_slack
 from settings import SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL, ANVIL_UI_URL, BASE_URL
 from seqr.views.utils.variant_utils import update_project_saved_variant_json, reset_cached_search_results
+from collections import defaultdict
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,10 +26,13 @@ def _get_samples_json(updated_samples, inactivated_sample_guids, project_guid):
     }
     updated_individuals = {s['individualGuid'] for s in updated_sample_json}
     if updated_individuals:
-        individuals = Individual.objects.filter(
-            guid__in=updated_individuals).prefetch_related('sample_set')
+        individual_sample_guids = defaultdict(list)
+        for individual_guid, sample_guid in Sample.objects.filter(
+                individual__guid__in=updated_individuals).values_list('individual__guid', 'guid'):
+            individual_sample_guids[individual_guid].append(sample_guid)
         response['individualsByGuid'] = {
-            ind.guid: {'sampleGuids': [s.guid for s in ind.sample_set.all()]} for ind in individuals
+            individual_guid: {'sampleGuids': sample_guids}
+            for individual_guid, sample_guids in individual_sample_guids.items()
         }
     return response
 
@@ -79,15 +83,14 @@ def add_variants_dataset_via_command(request_json, user, project_guid):
     updated_samples = Sample.objects.filter(guid__in=activated_sample_guids)
 
     if is_internal_anvil_project(project):
-        updated_individuals = {
-            sample.individual_id for sample in updated_samples}
-        previous_loaded_individuals = {
-            sample.individual_id for sample in Sample.objects.filter(
-                individual__in=updated_individuals, sample_type=sample_type, dataset_type=dataset_type,
-            ).exclude(elasticsearch_index=elasticsearch_index)}
+        updated_individuals = set(
+            updated_samples.values_list('individual_id', flat=True))
+        previous_loaded_individuals = set(Sample.objects.filter(
+            individual__in=updated_individuals, sample_type=sample_type, dataset_type=dataset_type,
+        ).exclude(elasticsearch_index=elasticsearch_index).values_list('individual_id', flat=True))
         previous_loaded_individuals.update(matched_individual_ids)
-        new_sample_ids = [
-            sample.sample_id for sample in updated_samples if sample.individual_id not in previous_loaded_individuals]
+        new_sample_ids = list(updated_samples.exclude(
+            individual_id__in=previous_loaded_individuals).values_list('sample_id', flat=True))
         safe_post_to_slack(
             SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL,
             """{num_sample} new {sample_type}{dataset_type} samples are loaded in {base_url}project/{guid}/project_page
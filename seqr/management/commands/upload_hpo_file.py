@@ -2,31 +2,17 @@ from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from seqr.models import Individual, Family
 from seqr.views.utils.permissions_utils import get_project_and_check_permissions
-from django.db.models import prefetch_related_objects
-from collections import defaultdict
 from seqr.views.utils.file_utils import parse_file
-from seqr.views.utils.json_to_orm_utils import update_model_from_json
-from seqr.views.apis.individual_api import INDIVIDUAL_GUID_COL, ASSIGNED_ANALYST_COL, INDIVIDUAL_METADATA_FIELDS, _process_hpo_records
+from seqr.views.apis.individual_api import INDIVIDUAL_GUID_COL, _process_hpo_records, _bulk_update_individuals_metadata
 from seqr.views.utils.orm_to_json_utils import _get_json_for_individuals,    _get_json_for_families
 
 
 def save_individuals_metadata_table_via_command(json_records, user, project, project_guid):
     individual_guids = [record[INDIVIDUAL_GUID_COL] for record in json_records]
-    individuals = Individual.objects.filter(
-        family__project=project, guid__in=individual_guids)
-    individuals_by_guid = {i.guid: i for i in individuals}
-
-    if any(ASSIGNED_ANALYST_COL in record for record in json_records):
-        prefetch_related_objects(individuals, 'family')
-    family_assigned_analysts = defaultdict(list)
-
-    for record in json_records:
-        individual = individuals_by_guid[record[INDIVIDUAL_GUID_COL]]
-        update_model_from_json(
-            individual, {k: record[k] for k in INDIVIDUAL_METADATA_FIELDS.keys() if k in record}, user=user)
-        if record.get(ASSIGNED_ANALYST_COL):
-            family_assigned_analysts[record[ASSIGNED_ANALYST_COL]].append(
-                individual.family.id)
+    individuals_by_guid = Individual.objects.select_related('family').filter(
+        family__project=project).in_bulk(individual_guids, field_name='guid')
+
+    family_assigned_analysts = _bulk_update_individuals_metadata(json_records, individuals_by_guid, user)
 
     response = {
         'individualsByGuid': {
@@ -37,9 +23,9 @@ def save_individuals_metadata_table_via_command(json_records, user, project, pro
 
     if family_assigned_analysts:
         updated_families = set()
-        for user in User.objects.filter(email__in=family_assigned_analysts.keys()):
+        for analyst in User.objects.filter(email__in=family_assigned_analysts.keys()).only('id', 'email'):
             updated = Family.bulk_update(user, {
-                                         'assigned_analyst': user}, id__in=family_assigned_analysts[user.email])
+                                         'assigned_analyst': analyst}, id__in=family_assigned_analysts[analyst.email])
             updated_families.update(updated)
 
         response['familiesByGuid'] = {
@@ -1,9 +1,27 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from seqr.models import Individual, Project
+from seqr.views.utils.file_utils import parse_file
 from seqr.views.utils.individual_utils import add_or_update_individuals_and_families
 from seqr.views.utils.pedigree_info_utils import parse_pedigree_table
 
+EXCEL_FILE_EXTENSIONS = ('.xls', '.xlsx')
+TEXT_FILE_EXTENSIONS = ('.tsv', '.fam', '.ped', '.csv', '.json')
+
+
+def _parse_individuals_file(filename):
+    if filename.endswith(EXCEL_FILE_EXTENSIONS):
+        # excel files are read from a binary stream, the same as uploaded excel files
+        with open(filename, 'rb') as f:
+            return parse_file(filename, f)
+
+    with open(filename, 'r') as f:
+        if filename.endswith(TEXT_FILE_EXTENSIONS):
+            return parse_file(filename, f)
+        # files with any other extension are parsed as tab-separated
+        return [[elt.strip() for elt in line.split('\t')] for line in f]
+
+
 class Command(BaseCommand):
 
     def add_arguments(self, parser):
@@ -16,15 +34,7 @@ class Command(BaseCommand):
         filename = options['input']
         user = options['user']
 
-        #f = open('/home/ubuntu/tmp/34_individuals.tsv','r')
-        f = open(filename,'r')
-        #contents = f.readlines()
-
-        list_of_lists = []
-
-        for line in f:
-            inner_list = [elt.strip() for elt in line.split('\t')]
-            list_of_lists.append(inner_list)
+        list_of_lists = _parse_individuals_file(filename)
 
 
         user = User.objects.get(id=user)
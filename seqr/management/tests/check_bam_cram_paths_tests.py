@@ -3,12 +3,14 @@ import mock
 from django.core.management import call_command
 from django.test import TestCase
 from seqr.models import IgvSample
+from seqr.utils.file_utils import _get_google_storage_client
 from settings import SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL
 
 class CheckBamCramPathsTest(TestCase):
     fixtures = ['users', '1kg_project']
 
     def setUp(self):
+        _get_google_storage_client.cache_clear()
         existing_sample = IgvSample.objects.first()
         IgvSample.objects.create(
             individual=existing_sample.individual,
@@ -16,18 +18,18 @@ class CheckBamCramPathsTest(TestCase):
             file_path='gs://missing-bucket/missing_file',
         )
 
-    @mock.patch('hail.hadoop_is_file')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.utils.communication_utils.safe_post_to_slack')
     @mock.patch('seqr.management.commands.check_bam_cram_paths.logger')
-    def test_command_with_project(self, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file):
-        mock_hadoop_is_file.return_value = False
+    def test_command_with_project(self, mock_logger, mock_safe_post_to_slack, mock_storage_client):
+        mock_storage_client.return_value.bucket.return_value.blob.return_value.exists.return_value = False
         call_command('check_bam_cram_paths', '1kg project n\u00e5me with uni\u00e7\u00f8de')
-        self._check_results(1, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file)
+        self._check_results(1, mock_logger, mock_safe_post_to_slack, mock_storage_client)
 
-    @mock.patch('hail.hadoop_is_file')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.management.commands.check_bam_cram_paths.logger')
-    def test_command_with_other_project(self, mock_logger, mock_hadoop_is_file):
-        mock_hadoop_is_file.return_value = False
+    def test_command_with_other_project(self, mock_logger, mock_storage_client):
+        mock_storage_client.return_value.bucket.return_value.blob.return_value.exists.return_value = False
         call_command('check_bam_cram_paths', '1kg project')
         self.assertEqual(IgvSample.objects.filter(file_path='').count(), 0)
         self.assertEqual(IgvSample.objects.count(), 2)
@@ -38,26 +40,41 @@ class CheckBamCramPathsTest(TestCase):
         ]
         mock_logger.info.assert_has_calls(calls)
 
-    @mock.patch('hail.hadoop_is_file')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.utils.communication_utils.safe_post_to_slack')
     @mock.patch('seqr.management.commands.check_bam_cram_paths.logger')
-    def test_command(self, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file):
-        mock_hadoop_is_file.return_value = False
+    def test_command(self, mock_logger, mock_safe_post_to_slack, mock_storage_client):
+        mock_storage_client.return_value.bucket.return_value.blob.return_value.exists.return_value = False
         call_command('check_bam_cram_paths')
-        self._check_results(1, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file)
+        self._check_results(1, mock_logger, mock_safe_post_to_slack, mock_storage_client)
 
-    @mock.patch('hail.hadoop_is_file')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.utils.communication_utils.safe_post_to_slack')
     @mock.patch('seqr.management.commands.check_bam_cram_paths.logger')
-    def test_dry_run_arg(self, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file):
-        mock_hadoop_is_file.return_value = False
+    def test_dry_run_arg(self, mock_logger, mock_safe_post_to_slack, mock_storage_client):
+        mock_storage_client.return_value.bucket.return_value.blob.return_value.exists.return_value = False
         call_command('check_bam_cram_paths', '--dry-run')
-        self._check_results(0, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file)
+        self._check_results(0, mock_logger, mock_safe_post_to_slack, mock_storage_client)
 
-    def _check_results(self, num_paths_deleted, mock_logger, mock_safe_post_to_slack, mock_hadoop_is_file):
+    @mock.patch('seqr.utils.file_utils.logger')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    @mock.patch('seqr.utils.communication_utils.safe_post_to_slack')
+    @mock.patch('seqr.management.commands.check_bam_cram_paths.logger')
+    def test_command_with_failed_lookup(self, mock_logger, mock_safe_post_to_slack, mock_storage_client, mock_file_logger):
+        mock_storage_client.return_value.bucket.return_value.blob.return_value.exists.side_effect = Exception(
+            '403 Forbidden')
+        call_command('check_bam_cram_paths', '--dry-run')
+        self._check_results(0, mock_logger, mock_safe_post_to_slack, mock_storage_client)
+        mock_file_logger.error.assert_called_once_with(
+            'Error checking if gs://missing-bucket/missing_file exists: 403 Forbidden', None)
+
+    def _check_results(self, num_paths_deleted, mock_logger, mock_safe_post_to_slack, mock_storage_client):
         self.assertEqual(IgvSample.objects.filter(file_path='').count(), num_paths_deleted)
         self.assertEqual(IgvSample.objects.count(), 2)
-        mock_hadoop_is_file.assert_called_with("gs://missing-bucket/missing_file")
+        mock_client = mock_storage_client.return_value
+        mock_client.bucket.assert_called_with('missing-bucket', user_project=None)
+        mock_client.bucket.return_value.blob.assert_called_with('missing_file')
+        mock_client.bucket.return_value.blob.return_value.exists.assert_called_with()
 
         calls = [
             mock.call('Individual: NA19675_1  file not found: gs://missing-bucket/missing_file'),
@@ -0,0 +1,77 @@
+import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from seqr.models import IgvSample
+
+PROJECT_GUID = 'R0001_1kg'
+DATA_MANAGER_USER_ID = '16'
+
+
+@mock.patch('seqr.management.commands.upload_bams_file.logger')
+@mock.patch('seqr.management.commands.upload_bams_file.does_files_exist')
+@mock.patch('seqr.management.commands.upload_bams_file.open')
+class UploadBamsFileTest(TestCase):
+    fixtures = ['users', '1kg_project']
+
+    def _call_command(self):
+        call_command('upload_bams_file', '--project', PROJECT_GUID, '--input', 'samples.tsv', '--user', DATA_MANAGER_USER_ID)
+
+    def test_command(self, mock_open, mock_does_files_exist, mock_logger):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            'NA19675_1\t/readviz/NA19675.cram\n',
+            'NA19675_1\tgs://bucket/NA19675_1.bam\n',
+            'NA19678\tgs://bucket/NA19678.bam\tNA19678_sample\n',
+            'NA19679\tgs://bucket/NA19679.txt\n',
+            'NA19679\tgs://bucket/NA19679_missing.bam\n',
+        ]
+        mock_does_files_exist.return_value = {
+            'gs://bucket/NA19675_1.bam': True, 'gs://bucket/NA19678.bam': True, 'gs://bucket/NA19679_missing.bam': False,
+        }
+
+        self._call_command()
+
+        user = User.objects.get(id=DATA_MANAGER_USER_ID)
+        mock_open.assert_called_with('samples.tsv', 'r')
+        mock_does_files_exist.assert_called_once()
+        self.assertSetEqual(set(mock_does_files_exist.call_args[0][0]), {
+            'gs://bucket/NA19675_1.bam', 'gs://bucket/NA19678.bam', 'gs://bucket/NA19679_missing.bam',
+        })
+
+        updated_sample = IgvSample.objects.get(guid='S000145_na19675')
+        self.assertEqual(updated_sample.file_path, 'gs://bucket/NA19675_1.bam')
+        self.assertIsNone(updated_sample.sample_id)
+        self.assertIsNotNone(updated_sample.last_modified_date)
+
+        new_sample = IgvSample.objects.get(individual__individual_id='NA19678')
+        self.assertEqual(new_sample.guid, 'S{:010d}_na19678'.format(new_sample.id))
+        self.assertEqual(new_sample.sample_type, IgvSample.SAMPLE_TYPE_ALIGNMENT)
+        self.assertEqual(new_sample.file_path, 'gs://bucket/NA19678.bam')
+        self.assertEqual(new_sample.sample_id, 'NA19678_sample')
+        self.assertEqual(new_sample.created_by, user)
+        self.assertEqual(new_sample.last_modified_date, updated_sample.last_modified_date)
+
+        self.assertFalse(IgvSample.objects.filter(individual__individual_id='NA19679').exists())
+
+        mock_logger.info.assert_any_call('No change detected for 1 rows', user)
+        mock_logger.info.assert_called_with('Created 1 and updated 1 IGV samples', user)
+        mock_logger.error.assert_has_calls([
+            mock.call('Invalid file extension for "gs://bucket/NA19679.txt" - valid extensions are bam, cram, bigWig, '
+                      'junctions.bed.gz, bed.gz', user),
+            mock.call('Error accessing "gs://bucket/NA19679_missing.bam"', user),
+        ])
+
+    def test_unmatched_individuals(self, mock_open, mock_does_files_exist, mock_logger):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            'NA19678\tgs://bucket/NA19678.bam\n',
+            'NA_missing\tgs://bucket/NA_missing.bam\n',
+        ]
+
+        self._call_command()
+
+        mock_does_files_exist.assert_not_called()
+        self.assertFalse(IgvSample.objects.filter(individual__individual_id='NA19678').exists())
+        mock_logger.error.assert_called_once_with(
+            'The following Individual IDs do not exist: NA_missing', User.objects.get(id=DATA_MANAGER_USER_ID))
@@ -0,0 +1,61 @@
+import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from seqr.models import Individual
+
+PROJECT_GUID = 'R0001_1kg'
+HEADER = 'Family ID\tIndividual ID\tPaternal ID\tMaternal ID\tSex\tAffected Status\n'
+
+
+@mock.patch('seqr.management.commands.upload_data_file.logger')
+@mock.patch('seqr.management.commands.upload_data_file.open')
+class UploadDataFileTest(TestCase):
+    fixtures = ['users', '1kg_project']
+
+    def _call_command(self, *args):
+        call_command('upload_data_file', '--project', PROJECT_GUID, '--input', 'individuals.tsv', *args)
+
+    def test_command(self, mock_open, mock_logger):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            HEADER, '1\tNA_new\t\t\tF\tAffected\n',
+        ]
+
+        self._call_command('--user', '10')
+
+        mock_open.assert_called_with('individuals.tsv', 'r')
+        individual = Individual.objects.get(individual_id='NA_new')
+        self.assertEqual(individual.family.family_id, '1')
+        self.assertEqual(individual.family.project.guid, PROJECT_GUID)
+        self.assertEqual(individual.sex, 'F')
+        self.assertEqual(individual.affected, 'A')
+        self.assertEqual(individual.created_by, User.objects.get(id=10))
+        mock_logger.info.assert_called_with('Updated 1 individuals, 1 families and 0 family notes', individual.created_by)
+
+    def test_command_no_user(self, mock_open, mock_logger):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            HEADER, '1\tNA_new\t\t\tF\tAffected\n',
+        ]
+
+        self._call_command()
+
+        individual = Individual.objects.get(individual_id='NA_new')
+        self.assertEqual(individual.family.family_id, '1')
+        self.assertIsNone(individual.created_by)
+        mock_logger.info.assert_called_with('Updated 1 individuals, 1 families and 0 family notes', None)
+
+    def test_invalid_file(self, mock_open, mock_logger):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [HEADER, '1\tNA_new\n']
+
+        with self.assertRaises(CommandError) as ce:
+            self._call_command('--user', '10')
+        self.assertEqual(
+            str(ce.exception),
+            'Error while parsing file: individuals.tsv. Row 1 contains 2 columns: 1, NA_new, while header contains 6: '
+            'Family ID, Individual ID, Paternal ID, Maternal ID, Sex, Affected Status',
+        )
+        self.assertFalse(Individual.objects.filter(individual_id='NA_new').exists())
+        mock_logger.info.assert_not_called()
@@ -0,0 +1,53 @@
+from io import BytesIO
+import mock
+
+import openpyxl as xl
+
+from django.core.management import call_command
+from django.test import TestCase
+
+PROJECT_GUID = 'R0001_1kg'
+
+PARSED_ROWS = [['Family ID', 'Individual ID', 'Notes'], ['1', 'NA19675', 'affected']]
+
+
+@mock.patch('seqr.management.commands.upload_individuals_file.add_or_update_individuals_and_families')
+@mock.patch('seqr.management.commands.upload_individuals_file.parse_pedigree_table')
+@mock.patch('seqr.management.commands.upload_individuals_file.open')
+class UploadIndividualsFileTest(TestCase):
+    fixtures = ['users', '1kg_project']
+
+    def _call_command(self, filename, mock_parse_pedigree_table, mock_add_or_update):
+        mock_parse_pedigree_table.return_value = ([{'individualId': 'NA19675'}], [])
+        mock_add_or_update.return_value = ([], [], [])
+        call_command('upload_individuals_file', '--project', PROJECT_GUID, '--input', filename, '--user', '10')
+        mock_parse_pedigree_table.assert_called_with(PARSED_ROWS, filename=filename, user=mock.ANY)
+        mock_add_or_update.assert_called_with(mock.ANY, [{'individualId': 'NA19675'}], mock.ANY)
+
+    def test_excel_file(self, mock_open, mock_parse_pedigree_table, mock_add_or_update):
+        wb = xl.Workbook()
+        for row in PARSED_ROWS:
+            wb.active.append(row)
+        stream = BytesIO()
+        wb.save(stream)
+        stream.seek(0)
+        mock_open.return_value.__enter__.return_value = stream
+
+        self._call_command('individuals.xlsx', mock_parse_pedigree_table, mock_add_or_update)
+        mock_open.assert_called_with('individuals.xlsx', 'rb')
+
+    def test_tsv_file(self, mock_open, mock_parse_pedigree_table, mock_add_or_update):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            'Family ID\tIndividual ID\tNotes\n', '"1"\t"NA19675"\t"affected"\n',
+        ]
+
+        self._call_command('individuals.tsv', mock_parse_pedigree_table, mock_add_or_update)
+        mock_open.assert_called_with('individuals.tsv', 'r')
+
+    def test_other_file_extension(self, mock_open, mock_parse_pedigree_table, mock_add_or_update):
+        mock_open.return_value.__enter__.return_value.__iter__.return_value = [
+            'Family ID\tIndividual ID\tNotes\n', '1\tNA19675\taffected\n',
+        ]
+
+        self._call_command('individuals.txt', mock_parse_pedigree_table, mock_add_or_update)
+        mock_open.assert_called_with('individuals.txt', 'r')
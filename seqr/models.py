@@ -6,7 +6,7 @@ import random
 from django.contrib.auth.models import User, Group
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import PermissionDenied
-from django.db import models
+from django.db import models, transaction
 from django.db.models import base, options, ForeignKey, JSONField
 from django.utils import timezone
 from django.utils.text import slugify as __slugify
@@ -124,10 +124,23 @@ class ModelWithGUID(models.Model, metaclass=CustomModelBase):
 
     @classmethod
     def bulk_create(cls, user, new_models):
-        """Helper bulk create method that logs the creation"""
+        """Helper bulk create method that logs the creation. Models created without a guid are assigned one with
+        _compute_guid, the same as in save"""
+        models_without_guid = []
         for model in new_models:
             model.created_by = user
-        models = cls.objects.bulk_create(new_models)
+            if not model.guid:
+                # as in save, use a temporary random guid until the id needed by _compute_guid is generated
+                model.guid = str(random.randint(10**10, 10**11)) # nosec
+                models_without_guid.append(model)
+        if models_without_guid:
+            with transaction.atomic():
+                models = cls.objects.bulk_create(new_models)
+                for model in models_without_guid:
+                    model.guid = model._compute_guid()[:ModelWithGUID.MAX_GUID_SIZE]
+                cls.objects.bulk_update(models_without_guid, ['guid'])
+        else:
+            models = cls.objects.bulk_create(new_models)
         log_model_bulk_update(logger, models, user, 'create')
         return models
 
@@ -1,29 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import gzip
+import io
 import os
+import shlex
 import subprocess # nosec
+import zlib
 
 from seqr.utils.logging_utils import SeqrLogger
 
-from urllib.parse import urlparse
 import boto3
+from botocore.client import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.exceptions import ClientError
+from botocore.session import get_session
+from google.cloud import storage
+from requests.adapters import DEFAULT_POOLSIZE
+from tqdm import tqdm
 
 logger = SeqrLogger(__name__)
 
+# the storage client sends requests through a single requests session, so more workers than pooled connections only queue
+MAX_FILE_WORKERS = DEFAULT_POOLSIZE
+
 
 def run_command(command, user=None):
-    logger.info('==> {}'.format(command), user)
-    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True) # nosec
+    """Runs the given argument list directly, or a string command (only needed for pipelines) through the shell"""
+    shell = isinstance(command, str)
+    logger.info('==> {}'.format(command if shell else ' '.join(command)), user)
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=shell) # nosec
 
 
-def _run_gsutil_command(command, gs_path, gunzip=False, user=None):
+def _run_gsutil_command(command_args, gs_path, gunzip=False, user=None):
     #  Anvil buckets are requester-pays and we bill them to the anvil project
     google_project = get_google_project(gs_path)
-    project_arg = '-u {} '.format(google_project) if google_project else ''
-    command = 'gsutil {project_arg}{command} {gs_path}'.format(
-        project_arg=project_arg, command=command, gs_path=gs_path,
-    )
+    project_args = ['-u', google_project] if google_project else []
+    command = ['gsutil'] + project_args + command_args + [gs_path]
     if gunzip:
-        command += " | gunzip -c -q - "
+        command = ' '.join(shlex.quote(arg) for arg in command) + " | gunzip -c -q - "
 
     return run_command(command, user=user)
 
@@ -35,61 +49,104 @@ def _is_s3_file_path(file_path):
     return file_path.startswith("s3://")
 
 def parse_s3_path(s3path):
-    parsed = urlparse(s3path)
-    bucket = parsed.netloc
-    path = parsed.path[1:]
-    object_list = path.split('/')
-    filename = object_list[-1]
+    bucket, _, key = s3path[len('s3://'):].partition('/')
+    return bucket, key
+
+S3_ASSUME_ROLE_ARN = 'arn:aws:iam::905042445333:role/assumerole_by_seqr_account'
+S3_READ_CHUNK_SIZE = 128 * 1024
+S3_MISSING_FILE_ERROR_CODES = {'404', 'NoSuchKey', 'NotFound'}
+S3_CLIENT_CONFIG = Config(max_pool_connections=50, retries={'max_attempts': 5, 'mode': 'standard'})
+
+
+def _assume_s3_role():
+    credentials = boto3.client('sts').assume_role(RoleArn=S3_ASSUME_ROLE_ARN, RoleSessionName='seqr')['Credentials']
     return {
-        "bucket" : bucket,
-        "key" : path,
-        "filename" : filename
+        'access_key': credentials['AccessKeyId'],
+        'secret_key': credentials['SecretAccessKey'],
+        'token': credentials['SessionToken'],
+        'expiry_time': credentials['Expiration'].isoformat(),
     }
 
+
 #Need cross AWS account access
 def create_s3_session():
-    sts_client = boto3.client('sts')
-    #hard-coded so can fix
-    assumed_role_object = sts_client.assume_role(
-        RoleArn='arn:aws:iam::905042445333:role/assumerole_by_seqr_account',
-        RoleSessionName='seqr'
+    # the assumed role credentials are re-fetched by botocore shortly before they expire
+    botocore_session = get_session()
+    botocore_session._credentials = RefreshableCredentials.create_from_metadata(
+        metadata=_assume_s3_role(), refresh_using=_assume_s3_role, method='sts-assume-role',
     )
+    return boto3.Session(botocore_session=botocore_session)
 
-    #print(assumed_role_object)
-    credentials = assumed_role_object['Credentials']
 
-    session = boto3.Session(
-        aws_access_key_id=credentials['AccessKeyId'],
-        aws_secret_access_key=credentials['SecretAccessKey'],
-        aws_session_token=credentials['SessionToken']
-    )
+@lru_cache(maxsize=None)
+def _get_s3_client():
+    return create_s3_session().client('s3', config=S3_CLIENT_CONFIG)
 
-    return session
 
 def get_google_project(gs_path):
     return 'anvil-datastorage' if gs_path.startswith('gs://fc-secure') else None
 
 def does_file_exist(file_path, user=None):
     if is_google_bucket_file_path(file_path):
-        process = _run_gsutil_command('ls', file_path, user=user)
-        success = process.wait() == 0
-        if not success:
-            errors = [line.decode('utf-8').strip() for line in process.stdout]
-            logger.info(' '.join(errors), user)
-        return success
+        logger.info('==> Checking if {} exists'.format(file_path), user)
+        return _does_google_bucket_file_exist(_get_google_storage_client(), file_path)
     elif _is_s3_file_path(file_path):
-        #s3_client = boto3.client('s3')
-        s3_client = create_s3_session().client('s3')
-        parts = parse_s3_path(file_path)
-        response = s3_client.list_objects(
-            Bucket = parts['bucket'],
-            Prefix = parts['key']
-        )
-        return 'Contents' in response and len(response['Contents']) > 0
+        bucket, key = parse_s3_path(file_path)
+        try:
+            _get_s3_client().head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in S3_MISSING_FILE_ERROR_CODES:
+                return False
+            raise
+        return True
 
     return os.path.isfile(file_path)
 
 
+@lru_cache(maxsize=None)
+def _get_google_storage_client():
+    # the client resolves credentials and holds a pool of HTTP connections, so it is shared by all storage operations
+    return storage.Client()
+
+
+def _get_google_bucket_blob(client, gs_path):
+    bucket_name, _, blob_name = gs_path[len('gs://'):].partition('/')
+    #  Anvil buckets are requester-pays and we bill them to the anvil project
+    bucket = client.bucket(bucket_name, user_project=get_google_project(gs_path))
+    return bucket.blob(blob_name)
+
+
+def _does_google_bucket_file_exist(client, gs_path):
+    return _get_google_bucket_blob(client, gs_path).exists()
+
+
+def does_files_exist(file_paths, user=None, show_progress=False):
+    """Checks many files concurrently, using a single in-process storage client for google bucket paths
+
+    Args:
+        show_progress (bool): whether to display a progress bar while the files are checked, for command-line use
+
+    Returns:
+        dict: mapping of each file path to whether or not it exists
+    """
+    client = _get_google_storage_client() if any(is_google_bucket_file_path(file_path) for file_path in file_paths) else None
+
+    def _does_file_exist(file_path):
+        # an inaccessible path should be reported as missing rather than aborting the checks for every other path
+        try:
+            if is_google_bucket_file_path(file_path):
+                return _does_google_bucket_file_exist(client, file_path)
+            return does_file_exist(file_path, user=user)
+        except Exception as e:
+            logger.error('Error checking if {} exists: {}'.format(file_path, e), user)
+            return False
+
+    with ThreadPoolExecutor(max_workers=MAX_FILE_WORKERS) as executor:
+        results = executor.map(_does_file_exist, file_paths)
+        if show_progress:
+            results = tqdm(results, total=len(file_paths), unit=' files')
+        return dict(zip(file_paths, results))
+
 def file_iter(file_path, byte_range=None, raw_content=False, user=None):
     if is_google_bucket_file_path(file_path):
         for line in _google_bucket_file_iter(file_path, byte_range=byte_range, raw_content=raw_content, user=user):
@@ -98,13 +155,10 @@ def file_iter(file_path, byte_range=None, raw_content=False, user=None):
         for line in _s3_file_iter(file_path,byte_range=byte_range):
             yield line
     elif byte_range:
-        command = 'dd skip={offset} count={size} bs=1 if={file_path}'.format(
-            offset=byte_range[0],
-            size=byte_range[1]-byte_range[0],
-            file_path=file_path,
-        )
-        process = run_command(command, user=user)
-        for line in process.stdout:
+        with open(file_path, 'rb') as f:
+            f.seek(byte_range[0])
+            content = f.read(byte_range[1]-byte_range[0])
+        for line in io.BytesIO(content):
             yield line
     else:
         mode = 'rb' if raw_content else 'r'
@@ -116,57 +170,73 @@ def file_iter(file_path, byte_range=None, raw_content=False, user=None):
 
 def _google_bucket_file_iter(gs_path, byte_range=None, raw_content=False, user=None):
     """Iterate over lines in the given file"""
-    range_arg = ' -r {}-{}'.format(byte_range[0], byte_range[1]) if byte_range else ''
-    process = _run_gsutil_command(
-        'cat{}'.format(range_arg), gs_path, gunzip=gs_path.endswith("gz") and not raw_content, user=user)
-    for line in process.stdout:
+    if byte_range:
+        lines = _google_bucket_byte_range_iter(gs_path, byte_range, raw_content=raw_content, user=user)
+    else:
+        lines = _run_gsutil_command(
+            ['cat'], gs_path, gunzip=gs_path.endswith("gz") and not raw_content, user=user).stdout
+    for line in lines:
         if not raw_content:
             line = line.decode('utf-8')
         yield line
 
+def _google_bucket_byte_range_iter(gs_path, byte_range, raw_content=False, user=None):
+    logger.info('==> Downloading bytes {}-{} of {}'.format(byte_range[0], byte_range[1], gs_path), user)
+    content = _get_google_bucket_blob(_get_google_storage_client(), gs_path).download_as_string(
+        start=byte_range[0], end=byte_range[1])
+    if gs_path.endswith("gz") and not raw_content:
+        content = _gunzip_partial_content(content)
+    return io.BytesIO(content)
+
+
+def _gunzip_partial_content(content):
+    # block gzipped files are many concatenated gzip members, and a byte range usually ends partway through one
+    decompressed = []
+    while content:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        decompressed.append(decompressor.decompress(content))
+        if not decompressor.eof:
+            break
+        content = decompressor.unused_data
+    return b''.join(decompressed)
+
+
 def _s3_file_iter(file_path, byte_range = None):
     logger.info("Iterating over s3 path: " + file_path,user=None)
 
-    #client = boto3.client('s3')
-    client = create_s3_session().client('s3')
+    client = _get_s3_client()
 
     range_arg = f"bytes={byte_range[0]}-{byte_range[1]}" if byte_range else ''
     logger.info("Byte range for s3: " + range_arg, user=None)
-    parts = parse_s3_path(file_path)
-    #t = tempfile.TemporaryFile()
+    bucket, key = parse_s3_path(file_path)
     r = client.get_object(
-        Bucket=parts['bucket'],
-        Key=parts['key'],
+        Bucket=bucket,
+        Key=key,
         Range=range_arg,
     )
-    for line in r['Body']:
-        yield line
+    # iterating the body directly reads it in 1 KB chunks
+    for chunk in r['Body'].iter_chunks(chunk_size=S3_READ_CHUNK_SIZE):
+        yield chunk
+
+def _validate_google_bucket_path(gs_path):
+    if not is_google_bucket_file_path(gs_path):
+        raise Exception('A Google Storage path is expected.')
+
 
 def mv_file_to_gs(local_path, gs_path, user=None):
-    command = 'mv {}'.format(local_path)
-    _run_gsutil_with_wait(command, gs_path, user)
+    _validate_google_bucket_path(gs_path)
+    logger.info('==> Moving {} to {}'.format(local_path, gs_path), user)
+    _get_google_bucket_blob(_get_google_storage_client(), gs_path).upload_from_filename(local_path)
+    os.remove(local_path)
 
 
 def get_gs_file_list(gs_path, user=None):
+    _validate_google_bucket_path(gs_path)
     gs_path = gs_path.rstrip('/')
-    command = 'ls'
+    logger.info('==> Listing files in {}'.format(gs_path), user)
 
-    # If a bucket is empty gsutil throws an error when running ls with ** instead of returning an empty list
-    subfolders = _run_gsutil_with_wait(command, gs_path, user, get_stdout=True)
-    if not subfolders:
-        return []
+    bucket_name, _, prefix = gs_path[len('gs://'):].partition('/')
+    bucket = _get_google_storage_client().bucket(bucket_name, user_project=get_google_project(gs_path))
+    blobs = bucket.list_blobs(prefix='{}/'.format(prefix) if prefix else None)
+    return ['gs://{}/{}'.format(bucket_name, blob.name) for blob in blobs]
 
-    all_lines = _run_gsutil_with_wait(command, f'{gs_path}/**', user, get_stdout=True)
-    return [line for line in all_lines if line.startswith(gs_path)]
-
-
-def _run_gsutil_with_wait(command, gs_path, user=None, get_stdout=False):
-    if not is_google_bucket_file_path(gs_path):
-        raise Exception('A Google Storage path is expected.')
-    process = _run_gsutil_command(command, gs_path, user=user)
-    if process.wait() != 0:
-        errors = [line.decode('utf-8').strip() for line in process.stdout]
-        raise Exception('Run command failed: ' + ' '.join(errors))
-    if get_stdout:
-        return [line.decode('utf-8').rstrip('\n') for line in process.stdout]
-    return process
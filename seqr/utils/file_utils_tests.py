@@ -1,63 +1,240 @@
+from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+import gzip
+import io
 import mock
+import struct
+import zlib
 
 from unittest import TestCase
-from seqr.utils.file_utils import mv_file_to_gs, get_gs_file_list
+from seqr.utils.file_utils import mv_file_to_gs, get_gs_file_list, file_iter, does_file_exist, \
+    does_files_exist, _get_s3_client, _get_google_storage_client, S3_ASSUME_ROLE_ARN, S3_CLIENT_CONFIG
+
+
+def _bgzf_block(data):
+    # block gzip members are standard gzip members with the compressed block size stored in an extra header field
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+    header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff' + struct.pack('<HccHH', 6, b'B', b'C', 2, len(deflated) + 25)
+    return header + deflated + struct.pack('<II', zlib.crc32(data), len(data))
 
 
 class FileUtilsTest(TestCase):
 
-    @mock.patch('seqr.utils.file_utils.subprocess')
+    def setUp(self):
+        _get_google_storage_client.cache_clear()
+
+    @mock.patch('seqr.utils.file_utils.os.remove')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.utils.file_utils.logger')
-    def test_mv_file_to_gs(self, mock_logger, mock_subproc):
+    def test_mv_file_to_gs(self, mock_logger, mock_storage_client, mock_remove):
         with self.assertRaises(Exception) as ee:
             mv_file_to_gs('/temp_path', '/another_path', user=None)
         self.assertEqual(str(ee.exception),  'A Google Storage path is expected.')
+        mock_storage_client.assert_not_called()
 
-        process = mock_subproc.Popen.return_value
-        process.wait.return_value = -1
-        process.stdout = [b'-bash: gsutil: command not found.\n', b'Please check the path.\n']
+        mock_bucket = mock_storage_client.return_value.bucket
+        mock_upload = mock_bucket.return_value.blob.return_value.upload_from_filename
+        mock_upload.side_effect = Exception('403 Forbidden')
         with self.assertRaises(Exception) as ee:
             mv_file_to_gs('/temp_path', 'gs://bucket/target_path', user=None)
-        self.assertEqual(str(ee.exception), 'Run command failed: -bash: gsutil: command not found. Please check the path.')
-        mock_subproc.Popen.assert_called_with('gsutil mv /temp_path gs://bucket/target_path', stdout=mock_subproc.PIPE, stderr=mock_subproc.STDOUT, shell=True)
-        mock_logger.info.assert_called_with('==> gsutil mv /temp_path gs://bucket/target_path', None)
-        process.wait.assert_called_with()
+        self.assertEqual(str(ee.exception), '403 Forbidden')
+        mock_remove.assert_not_called()
 
-        mock_subproc.reset_mock()
         mock_logger.reset_mock()
-        process.wait.return_value = 0
-        mv_file_to_gs('/temp_path', 'gs://bucket/target_path', user=None)
-        mock_subproc.Popen.assert_called_with('gsutil mv /temp_path gs://bucket/target_path', stdout=mock_subproc.PIPE, stderr=mock_subproc.STDOUT, shell=True)
-        mock_logger.info.assert_called_with('==> gsutil mv /temp_path gs://bucket/target_path', None)
-        process.wait.assert_called_with()
+        mock_upload.side_effect = None
+        mv_file_to_gs('/temp_path', 'gs://fc-secure-bucket/target_path', user=None)
+        mock_bucket.assert_called_with('fc-secure-bucket', user_project='anvil-datastorage')
+        mock_bucket.return_value.blob.assert_called_with('target_path')
+        mock_upload.assert_called_with('/temp_path')
+        mock_remove.assert_called_with('/temp_path')
+        mock_logger.info.assert_called_with('==> Moving /temp_path to gs://fc-secure-bucket/target_path', None)
 
-    @mock.patch('seqr.utils.file_utils.subprocess')
+    @mock.patch('seqr.utils.file_utils.storage.Client')
     @mock.patch('seqr.utils.file_utils.logger')
-    def test_get_gs_file_list(self, mock_logger, mock_subproc):
+    def test_get_gs_file_list(self, mock_logger, mock_storage_client):
         with self.assertRaises(Exception) as ee:
             get_gs_file_list('/temp_path')
         self.assertEqual(str(ee.exception),  'A Google Storage path is expected.')
+        mock_storage_client.assert_not_called()
 
-        process = mock_subproc.Popen.return_value
-        process.wait.return_value = -1
-        process.stdout = [b'-bash: gsutil: command not found.\n', b'Please check the path.\n']
-        with self.assertRaises(Exception) as ee:
-            get_gs_file_list('gs://bucket/target_path/', user=None)
-        self.assertEqual(str(ee.exception), 'Run command failed: -bash: gsutil: command not found. Please check the path.')
-        mock_subproc.Popen.assert_called_with('gsutil ls gs://bucket/target_path', stdout=mock_subproc.PIPE,
-                                              stderr=mock_subproc.STDOUT, shell=True)
-        mock_logger.info.assert_called_with('==> gsutil ls gs://bucket/target_path', None)
-        process.wait.assert_called_with()
-
-        mock_subproc.reset_mock()
+        mock_bucket = mock_storage_client.return_value.bucket.return_value
+        mock_bucket.list_blobs.return_value = []
+        file_list = get_gs_file_list('gs://bucket/target_path/', user=None)
+        self.assertEqual(file_list, [])
+        mock_storage_client.return_value.bucket.assert_called_with('bucket', user_project=None)
+        mock_bucket.list_blobs.assert_called_with(prefix='target_path/')
+        mock_logger.info.assert_called_with('==> Listing files in gs://bucket/target_path', None)
+
+        mock_storage_client.reset_mock()
         mock_logger.reset_mock()
-        process.wait.return_value = 0
-        process.stdout = [b'\n', b'\n', b'Updates are available for some Cloud SDK components.  To install them,\n',
-                          b'please run:\n', b'  $ gcloud components update\n',
-                          b'gs://bucket/target_path/id_file.txt\n', b'gs://bucket/target_path/data.vcf.gz\n']
-        file_list = get_gs_file_list('gs://bucket/target_path', user=None)
-        mock_subproc.Popen.assert_called_with('gsutil ls gs://bucket/target_path/**', stdout=mock_subproc.PIPE,
-                                              stderr=mock_subproc.STDOUT, shell=True)
-        mock_logger.info.assert_called_with('==> gsutil ls gs://bucket/target_path/**', None)
-        process.wait.assert_called_with()
-        self.assertEqual(file_list, ['gs://bucket/target_path/id_file.txt', 'gs://bucket/target_path/data.vcf.gz'])
+        blobs = [mock.MagicMock(), mock.MagicMock()]
+        blobs[0].name = 'target_path/id_file.txt'
+        blobs[1].name = 'target_path/data.vcf.gz'
+        mock_bucket.list_blobs.return_value = blobs
+        file_list = get_gs_file_list('gs://fc-secure-bucket/target_path', user=None)
+        mock_storage_client.return_value.bucket.assert_called_with('fc-secure-bucket', user_project='anvil-datastorage')
+        mock_bucket.list_blobs.assert_called_with(prefix='target_path/')
+        mock_logger.info.assert_called_with('==> Listing files in gs://fc-secure-bucket/target_path', None)
+        self.assertEqual(file_list, ['gs://fc-secure-bucket/target_path/id_file.txt', 'gs://fc-secure-bucket/target_path/data.vcf.gz'])
+
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_google_bucket_byte_range_file_iter(self, mock_logger, mock_storage_client):
+        mock_blob = mock_storage_client.return_value.bucket.return_value.blob.return_value
+        mock_blob.download_as_string.return_value = b'##fileformat=VCFv4.2\n#CHROM\tPOS\n1\t'
+        lines = list(file_iter('gs://fc-secure-bucket/test.vcf', byte_range=(0, 100)))
+        self.assertListEqual(lines, ['##fileformat=VCFv4.2\n', '#CHROM\tPOS\n', '1\t'])
+        mock_storage_client.return_value.bucket.assert_called_with('fc-secure-bucket', user_project='anvil-datastorage')
+        mock_storage_client.return_value.bucket.return_value.blob.assert_called_with('test.vcf')
+        mock_blob.download_as_string.assert_called_with(start=0, end=100)
+        mock_logger.info.assert_called_with('==> Downloading bytes 0-100 of gs://fc-secure-bucket/test.vcf', None)
+
+        # block gzipped content is truncated mid-block by the byte range
+        mock_blob.download_as_string.return_value = gzip.compress(b'##fileformat=VCFv4.2\n') + gzip.compress(
+            b'#CHROM\tPOS\n1\t100\n')[:-8]
+        lines = list(file_iter('gs://bucket/test.vcf.gz', byte_range=(0, 100)))
+        self.assertListEqual(lines, ['##fileformat=VCFv4.2\n', '#CHROM\tPOS\n', '1\t100\n'])
+        mock_storage_client.return_value.bucket.assert_called_with('bucket', user_project=None)
+
+        lines = list(file_iter('gs://bucket/test.vcf.gz', byte_range=(0, 100), raw_content=True))
+        self.assertListEqual(lines, list(io.BytesIO(mock_blob.download_as_string.return_value)))
+
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_google_bucket_byte_range_gzip_file_iter(self, mock_logger, mock_storage_client):
+        mock_download = mock_storage_client.return_value.bucket.return_value.blob.return_value.download_as_string
+
+        # complete bgzipped blocks, including the empty end-of-file block
+        mock_download.return_value = _bgzf_block(b'##fileformat=VCFv4.2\n') + _bgzf_block(
+            b'#CHROM\tPOS\n1\t100\n') + _bgzf_block(b'')
+        lines = list(file_iter('gs://bucket/test.vcf.bgz', byte_range=(0, 100)))
+        self.assertListEqual(lines, ['##fileformat=VCFv4.2\n', '#CHROM\tPOS\n', '1\t100\n'])
+
+        # the range ends partway through the compressed data of the last member
+        member = gzip.compress(b'#CHROM\tPOS\n1\t100\n', compresslevel=0)
+        mock_download.return_value = _bgzf_block(b'##fileformat=VCFv4.2\n') + member[:len(member) - 12]
+        lines = list(file_iter('gs://bucket/test.vcf.gz', byte_range=(0, 100)))
+        self.assertListEqual(lines, ['##fileformat=VCFv4.2\n', '#CHROM\tPOS\n', '1\t'])
+
+        # the range ends partway through the header of the next member
+        mock_download.return_value = _bgzf_block(b'#CHROM\tPOS\n') + _bgzf_block(b'1\t100\n')[:5]
+        lines = list(file_iter('gs://bucket/test.vcf.gz', byte_range=(0, 100)))
+        self.assertListEqual(lines, ['#CHROM\tPOS\n'])
+
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_does_file_exist(self, mock_logger, mock_storage_client):
+        mock_bucket = mock_storage_client.return_value.bucket
+        mock_exists = mock_bucket.return_value.blob.return_value.exists
+        mock_exists.return_value = True
+        self.assertTrue(does_file_exist('gs://bucket/dir/sample.bam'))
+        mock_bucket.assert_called_with('bucket', user_project=None)
+        mock_bucket.return_value.blob.assert_called_with('dir/sample.bam')
+        mock_logger.info.assert_called_with('==> Checking if gs://bucket/dir/sample.bam exists', None)
+
+        mock_exists.return_value = False
+        self.assertFalse(does_file_exist('gs://fc-secure-bucket/missing.bam'))
+        mock_bucket.assert_called_with('fc-secure-bucket', user_project='anvil-datastorage')
+        mock_storage_client.assert_called_once_with()
+
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_does_files_exist(self, mock_logger, mock_storage_client):
+        def _mock_blob(blob_name):
+            blob = mock.MagicMock()
+            if blob_name == 'forbidden.bam':
+                blob.exists.side_effect = Exception('403 Forbidden')
+            else:
+                blob.exists.return_value = blob_name == 'sample.bam'
+            return blob
+        mock_storage_client.return_value.bucket.return_value.blob.side_effect = _mock_blob
+
+        file_exists = does_files_exist(
+            ['gs://bucket/sample.bam', 'gs://bucket/missing.bam', 'gs://bucket/forbidden.bam'], user=None)
+        self.assertDictEqual(file_exists, {
+            'gs://bucket/sample.bam': True,
+            'gs://bucket/missing.bam': False,
+            'gs://bucket/forbidden.bam': False,
+        })
+        mock_storage_client.return_value.bucket.assert_called_with('bucket', user_project=None)
+        mock_logger.error.assert_called_once_with(
+            'Error checking if gs://bucket/forbidden.bam exists: 403 Forbidden', None)
+
+        # the storage client is created once and reused
+        does_files_exist(['gs://bucket/sample.bam'])
+        get_gs_file_list('gs://bucket/target_path')
+        mock_storage_client.assert_called_once_with()
+
+    def _set_up_s3_mocks(self, mock_boto3):
+        _get_s3_client.cache_clear()
+        mock_boto3.client.return_value.assume_role.return_value = {'Credentials': {
+            'AccessKeyId': 'access_key', 'SecretAccessKey': 'secret_key', 'SessionToken': 'token',
+            'Expiration': datetime(2100, 1, 1, tzinfo=timezone.utc),
+        }}
+        return mock_boto3.Session.return_value.client.return_value
+
+    @mock.patch('seqr.utils.file_utils.get_session')
+    @mock.patch('seqr.utils.file_utils.boto3')
+    def test_s3_does_file_exist(self, mock_boto3, mock_get_session):
+        mock_s3_client = self._set_up_s3_mocks(mock_boto3)
+
+        self.assertTrue(does_file_exist('s3://bucket/dir/sample.bam'))
+        mock_s3_client.head_object.assert_called_with(Bucket='bucket', Key='dir/sample.bam')
+        mock_boto3.client.assert_called_with('sts')
+        mock_boto3.client.return_value.assume_role.assert_called_with(RoleArn=S3_ASSUME_ROLE_ARN, RoleSessionName='seqr')
+        credentials = mock_get_session.return_value._credentials
+        self.assertEqual(credentials.access_key, 'access_key')
+        self.assertEqual(credentials.secret_key, 'secret_key')
+        self.assertEqual(credentials.token, 'token')
+        mock_boto3.Session.assert_called_with(botocore_session=mock_get_session.return_value)
+        mock_boto3.Session.return_value.client.assert_called_with('s3', config=S3_CLIENT_CONFIG)
+
+        for error_code in ['404', 'NoSuchKey', 'NotFound']:
+            mock_s3_client.head_object.side_effect = ClientError({'Error': {'Code': error_code}}, 'HeadObject')
+            self.assertFalse(does_file_exist('s3://bucket/missing.bam'))
+
+        mock_s3_client.head_object.side_effect = ClientError({'Error': {'Code': '403'}}, 'HeadObject')
+        with self.assertRaises(ClientError):
+            does_file_exist('s3://bucket/forbidden.bam')
+
+        # the assumed role session and client are only created once
+        mock_boto3.client.return_value.assume_role.assert_called_once()
+        mock_boto3.Session.assert_called_once()
+
+    @mock.patch('seqr.utils.file_utils.logger')
+    @mock.patch('seqr.utils.file_utils.get_session')
+    @mock.patch('seqr.utils.file_utils.boto3')
+    def test_s3_does_files_exist(self, mock_boto3, mock_get_session, mock_logger):
+        mock_s3_client = self._set_up_s3_mocks(mock_boto3)
+
+        def _mock_head_object(Bucket, Key):
+            if Key == 'missing.bam':
+                raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'HeadObject')
+            if Key == 'forbidden.bam':
+                raise ClientError({'Error': {'Code': '403', 'Message': 'Forbidden'}}, 'HeadObject')
+        mock_s3_client.head_object.side_effect = _mock_head_object
+
+        file_exists = does_files_exist(['s3://bucket/sample.bam', 's3://bucket/missing.bam', 's3://bucket/forbidden.bam'])
+        self.assertDictEqual(file_exists, {
+            's3://bucket/sample.bam': True,
+            's3://bucket/missing.bam': False,
+            's3://bucket/forbidden.bam': False,
+        })
+        mock_logger.error.assert_called_once_with(
+            'Error checking if s3://bucket/forbidden.bam exists: An error occurred (403) when calling the HeadObject '
+            'operation: Forbidden', None)
+
+    @mock.patch('seqr.utils.file_utils.logger')
+    @mock.patch('seqr.utils.file_utils.get_session')
+    @mock.patch('seqr.utils.file_utils.boto3')
+    def test_s3_file_iter(self, mock_boto3, mock_get_session, mock_logger):
+        mock_s3_client = self._set_up_s3_mocks(mock_boto3)
+        mock_s3_client.get_object.return_value['Body'].iter_chunks.return_value = [b'chunk 1', b'chunk 2']
+
+        self.assertListEqual(list(file_iter('s3://bucket/dir/sample.bam', byte_range=(0, 100))), [b'chunk 1', b'chunk 2'])
+        mock_s3_client.get_object.assert_called_with(Bucket='bucket', Key='dir/sample.bam', Range='bytes=0-100')
+        mock_s3_client.get_object.return_value['Body'].iter_chunks.assert_called_with(chunk_size=128 * 1024)
+
+        list(file_iter('s3://bucket/dir/sample.bam'))
+        mock_s3_client.get_object.assert_called_with(Bucket='bucket', Key='dir/sample.bam', Range='')
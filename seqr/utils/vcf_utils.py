@@ -22,6 +22,7 @@ EXPECTED_META_FIELDS ={
 }
 
 REQUIRED_HEADERS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT']
+NUM_FIXED_HEADERS = len(REQUIRED_HEADERS)
 
 
 def _validate_vcf_header(header):
@@ -46,6 +47,20 @@ def _validate_vcf_meta(meta):
         raise ErrorsWarningsException(errors, [])
 
 
+def _parse_vcf_header_line(line):
+    # Sample ids follow the fixed columns, so only split them apart once the standard FORMAT position is confirmed
+    header_cols = line.rstrip().split('\t', NUM_FIXED_HEADERS)
+    if len(header_cols) >= NUM_FIXED_HEADERS and header_cols[NUM_FIXED_HEADERS - 1] == 'FORMAT':
+        header = header_cols[:NUM_FIXED_HEADERS]
+        samples = set(header_cols[NUM_FIXED_HEADERS].split('\t')) if len(header_cols) > NUM_FIXED_HEADERS else set()
+        return header, samples
+
+    header_cols = line.rstrip().split('\t')
+    format_indices = [index for index, col in enumerate(header_cols) if col == 'FORMAT']
+    format_index = format_indices[0] + 1 if format_indices else len(header_cols)
+    return header_cols[0:format_index], set(header_cols[format_index:])
+
+
 def _get_vcf_meta_info(line):
     r = re.search(r'##(?P<field>.*?)=<ID=(?P<id>[^,]*).*Type=(?P<type>[^,]*).*>$', line)
     if r:
@@ -61,11 +76,7 @@ def validate_vcf_and_get_samples(vcf_filename):
     for line in file_iter(vcf_filename, byte_range=byte_range):
         if line.startswith('#'):
             if line.startswith('#CHROM'):
-                header_cols = line.rstrip().split('\t')
-                format_indices = [index for index, col in enumerate(header_cols) if col == 'FORMAT']
-                format_index = format_indices[0] + 1 if format_indices else len(header_cols)
-                header = header_cols[0:format_index]
-                samples = set(header_cols[format_index:])
+                header, samples = _parse_vcf_header_line(line)
                 break
             else:
                 meta_info = _get_vcf_meta_info(line)
@@ -6,6 +6,7 @@ from django.urls.base import reverse
 import responses
 
 from seqr.models import Project
+from seqr.utils.file_utils import _get_google_storage_client
 from seqr.views.apis.anvil_workspace_api import anvil_workspace_page, create_project_from_workspace, \
     validate_anvil_vcf, grant_workspace_access, add_workspace_data, get_anvil_vcf_list
 from seqr.views.utils.test_utils import AnvilAuthenticationTestCase, AuthenticationTestCase, TEST_WORKSPACE_NAMESPACE,\
@@ -440,8 +441,9 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
                          '/login/google-oauth2?next=/api/create_project_from_workspace/my-seqr-billing/anvil-no-project-workspace1/validate_vcf')
 
     @mock.patch('seqr.utils.file_utils.logger')
-    @mock.patch('seqr.utils.file_utils.subprocess.Popen')
-    def test_get_anvil_vcf_list(self, mock_subprocess, mock_file_logger, mock_utils_logger):
+    @mock.patch('seqr.utils.file_utils.storage.Client')
+    def test_get_anvil_vcf_list(self, mock_storage_client, mock_file_logger, mock_utils_logger):
+        _get_google_storage_client.cache_clear()
         # Requesting to load data from a workspace without an existing project
         url = reverse(get_anvil_vcf_list, args=[TEST_WORKSPACE_NAMESPACE, TEST_WORKSPACE_NAME1])
         self.check_manager_login(url, login_redirect_url='/login/google-oauth2')
@@ -450,34 +452,25 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
                                                      self.collaborator_user)
 
         # Test empty bucket
-        mock_subprocess.return_value.wait.return_value = 0
-        mock_subprocess.return_value.stdout = b''
+        mock_bucket = mock_storage_client.return_value.bucket.return_value
+        mock_bucket.list_blobs.return_value = []
         response = self.client.get(url, content_type='application/json')
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual(response.json(), {'dataPathList': []})
-        mock_subprocess.assert_has_calls([
-            mock.call('gsutil ls gs://test_bucket', stdout=-1, stderr=-2, shell=True),
-            mock.call().wait(),
-        ])
+        mock_storage_client.return_value.bucket.assert_called_with('test_bucket', user_project=None)
+        mock_bucket.list_blobs.assert_called_with(prefix=None)
 
         # Test valid operation
-        mock_subprocess.return_value.stdout = [
-            b'Warning: some packages are out of date',
-            b'gs://test_bucket/test.vcf', b'gs://test_bucket/data/test.vcf.gz', b'gs://test_bucket/test.tsv',
-        ]
+        blobs = []
+        for name in ['test.vcf', 'data/test.vcf.gz', 'test.tsv']:
+            blob = mock.MagicMock()
+            blob.name = name
+            blobs.append(blob)
+        mock_bucket.list_blobs.return_value = blobs
         response = self.client.get(url, content_type='application/json')
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual(response.json(), {'dataPathList': ['/test.vcf', '/data/test.vcf.gz']})
-        mock_subprocess.assert_has_calls([
-            mock.call('gsutil ls gs://test_bucket', stdout=-1, stderr=-2, shell=True),
-            mock.call().wait(),
-            mock.call('gsutil ls gs://test_bucket/**', stdout=-1, stderr=-2, shell=True),
-            mock.call().wait(),
-        ])
-        mock_file_logger.info.assert_has_calls([
-            mock.call('==> gsutil ls gs://test_bucket', self.manager_user),
-            mock.call('==> gsutil ls gs://test_bucket/**', self.manager_user),
-        ])
+        mock_file_logger.info.assert_called_with('==> Listing files in gs://test_bucket', self.manager_user)
 
 
 class LoadAnvilDataAPITest(AnvilAuthenticationTestCase):
@@ -1,7 +1,9 @@
 import base64
 from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 import gzip
+from http.cookiejar import DefaultCookiePolicy
 import json
 import os
 import re
@@ -396,14 +398,23 @@ def load_rna_seq_sample_data(request, sample_guid):
 
 
 # Hop-by-hop HTTP response headers shouldn't be forwarded.
-# More info at: http://www.w3.org/Protocols/rfc2616/rfc2616-sec13.html#sec13.5.1
-EXCLUDE_HTTP_RESPONSE_HEADERS = {
+# More info at: http://www.w3.org/Protocols/rfc2616/rfc2616-sec13.html#sec13.5.1 and
+# https://datatracker.ietf.org/doc/html/rfc7230#section-6.1
+EXCLUDE_HTTP_RESPONSE_HEADERS = frozenset({
     'connection', 'keep-alive', 'proxy-authenticate',
-    'proxy-authorization', 'te', 'trailers', 'transfer-encoding', 'upgrade',
-}
+    'proxy-authorization', 'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade',
+})
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# share one session across proxied requests so connections to kibana are kept alive and reused
+kibana_session = requests.Session()
+# the session is shared by all users, so it must never store cookies set by kibana. Each user's own cookies are
+# forwarded with their request headers
+kibana_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+# (connect, read) timeouts in seconds, so a hung kibana can not tie up server workers indefinitely
+KIBANA_REQUEST_TIMEOUT = (5, 90)
+
 
 @data_manager_required
 @csrf_exempt
@@ -411,17 +422,17 @@ def proxy_to_kibana(request):
     headers = _convert_django_meta_to_http_headers(request.META)
     headers['Host'] = KIBANA_SERVER
     if KIBANA_ELASTICSEARCH_PASSWORD:
-        token = base64.b64encode('kibana:{}'.format(KIBANA_ELASTICSEARCH_PASSWORD).encode('utf-8'))
-        headers['Authorization'] = 'Basic {}'.format(token.decode('utf-8'))
+        headers['Authorization'] = _get_kibana_auth_header(KIBANA_ELASTICSEARCH_PASSWORD)
 
     url = "http://{host}{path}".format(host=KIBANA_SERVER, path=request.get_full_path())
 
-    request_method = getattr(requests.Session(), request.method.lower())
+    request_method = getattr(kibana_session, request.method.lower())
 
     try:
         # use stream=True because kibana returns gziped responses, and this prevents the requests module from
         # automatically unziping them
-        response = request_method(url, headers=headers, data=request.body, stream=True, verify=True)
+        response = request_method(
+            url, headers=headers, data=request.body, stream=True, verify=True, timeout=KIBANA_REQUEST_TIMEOUT)
         response_content = response.raw.read()
         # make sure the connection is released back to the connection pool
         # (based on http://docs.python-requests.org/en/master/user/advanced/#body-content-workflow)
@@ -444,6 +455,12 @@ def proxy_to_kibana(request):
         return HttpResponse("Error: Unable to connect to Kibana {}".format(e), status=400)
 
 
+@lru_cache()
+def _get_kibana_auth_header(password):
+    token = base64.b64encode('kibana:{}'.format(password).encode('utf-8'))
+    return 'Basic {}'.format(token.decode('utf-8'))
+
+
 def _convert_django_meta_to_http_headers(request_meta_dict):
     """Converts django request.META dictionary into a dictionary of HTTP headers."""
 
@@ -3,7 +3,8 @@ import json
 import re
 import requests
 
-from django.http import StreamingHttpResponse, HttpResponse
+from django.http import StreamingHttpResponse
+from requests.adapters import HTTPAdapter
 
 from seqr.models import Individual, IgvSample
 from seqr.utils.file_utils import file_iter, does_file_exist, is_google_bucket_file_path, run_command, get_google_project
@@ -20,6 +21,12 @@ logger = SeqrLogger(__name__)
 
 GS_STORAGE_ACCESS_CACHE_KEY = 'gs_storage_access_cache_entry'
 
+# IGV issues many concurrent range requests per track, so keep a shared pool of upstream connections alive
+proxy_session = requests.Session()
+proxy_session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+# (connect, read) timeouts in seconds, so a hung upstream can not tie up server workers indefinitely
+PROXY_REQUEST_TIMEOUT = (5, 60)
+
 
 @pm_or_data_manager_required
 def receive_igv_table_handler(request, project_guid):
@@ -143,10 +150,11 @@ def fetch_igv_track(request, project_guid, igv_track_path):
 def _stream_gs(request, gs_path):
     headers = _get_gs_rest_api_headers(request.META.get('HTTP_RANGE'), gs_path, user=request.user)
 
-    response = requests.get(
+    response = proxy_session.get(
         'https://storage.googleapis.com/{}'.format(gs_path.replace('gs://', '', 1)),
         headers=headers,
-        stream=True)
+        stream=True,
+        timeout=PROXY_REQUEST_TIMEOUT)
 
     return StreamingHttpResponse(response.iter_content(chunk_size=65536), status=response.status_code,
                                  content_type='application/octet-stream')
@@ -158,7 +166,7 @@ def _get_gs_rest_api_headers(range_header, gs_path, user=None):
         headers['Range'] = range_header
     google_project = get_google_project(gs_path)
     if google_project:
-        headers['x-goog-user-project'] = get_google_project(gs_path)
+        headers['x-goog-user-project'] = google_project
 
     return headers
 
@@ -166,7 +174,7 @@ def _get_gs_rest_api_headers(range_header, gs_path, user=None):
 def _get_token_expiry(token):
     response = requests.post('https://www.googleapis.com/oauth2/v1/tokeninfo',
                              headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                             data='access_token={}'.format(token))
+                             data='access_token={}'.format(token), timeout=PROXY_REQUEST_TIMEOUT)
     if response.status_code == 200:
         result = json.loads(response.text)
         return result['expires_in']
@@ -177,7 +185,7 @@ def _get_token_expiry(token):
 def _get_access_token(user):
     access_token = safe_redis_get_json(GS_STORAGE_ACCESS_CACHE_KEY)
     if not access_token:
-        process = run_command('gcloud auth print-access-token', user=user)
+        process = run_command(['gcloud', 'auth', 'print-access-token'], user=user)
         if process.wait() == 0:
             access_token = next(process.stdout).decode('utf-8').strip()
             expires_in = _get_token_expiry(access_token)
@@ -223,9 +231,6 @@ def igv_genomes_proxy(request, file_path):
     if range_header:
         headers['Range'] = range_header
 
-    genome_response = requests.get('https://s3.amazonaws.com/igv.{}'.format(file_path), headers=headers)
-    proxy_response = HttpResponse(
-        content=genome_response.content,
-        status=genome_response.status_code,
-    )
-    return proxy_response
+    genome_response = proxy_session.get(
+        'https://s3.amazonaws.com/igv.{}'.format(file_path), headers=headers, stream=True, timeout=PROXY_REQUEST_TIMEOUT)
+    return StreamingHttpResponse(genome_response.iter_content(chunk_size=65536), status=genome_response.status_code)
@@ -20,15 +20,15 @@ class IgvAPITest(AuthenticationTestCase):
 
     @responses.activate
     @mock.patch('seqr.utils.file_utils.logger')
+    @mock.patch('seqr.utils.file_utils._get_google_storage_client')
     @mock.patch('seqr.utils.file_utils.subprocess.Popen')
     @mock.patch('seqr.views.apis.igv_api.safe_redis_get_json')
     @mock.patch('seqr.views.apis.igv_api.safe_redis_set_json')
-    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_subprocess, mock_file_logger):
-        mock_ls_subprocess = mock.MagicMock()
+    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_subprocess, mock_storage_client, mock_file_logger):
+        mock_bucket = mock_storage_client.return_value.bucket
+        mock_bucket.return_value.blob.return_value.exists.return_value = False
         mock_access_token_subprocess = mock.MagicMock()
-        mock_subprocess.side_effect = [mock_ls_subprocess, mock_access_token_subprocess]
-        mock_ls_subprocess.stdout = iter([b'CommandException: One or more URLs matched no objects.'])
-        mock_ls_subprocess.wait.return_value = 1
+        mock_subprocess.side_effect = [mock_access_token_subprocess]
         mock_access_token_subprocess.stdout = iter([b'token1\n', b'token2\n'])
         mock_access_token_subprocess.wait.return_value = 0
         mock_get_redis.return_value = None
@@ -49,14 +49,13 @@ class IgvAPITest(AuthenticationTestCase):
         self.assertEqual(responses.calls[1].request.headers.get('x-goog-user-project'), 'anvil-datastorage')
         mock_get_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY)
         mock_set_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY, 'token1', expire=3594)
-        mock_subprocess.assert_has_calls([
-            mock.call('gsutil -u anvil-datastorage ls gs://fc-secure-project_A/sample_1.bam.bai', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),
-            mock.call('gcloud auth print-access-token', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),
-        ])
-        mock_ls_subprocess.wait.assert_called_once()
+        mock_bucket.assert_called_with('fc-secure-project_A', user_project='anvil-datastorage')
+        mock_bucket.return_value.blob.assert_called_with('sample_1.bam.bai')
+        mock_subprocess.assert_called_once_with(
+            ['gcloud', 'auth', 'print-access-token'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=False)
         mock_access_token_subprocess.wait.assert_called_once()
         mock_file_logger.info.assert_any_call(
-            'CommandException: One or more URLs matched no objects.', self.collaborator_user)
+            '==> Checking if gs://fc-secure-project_A/sample_1.bam.bai exists', self.collaborator_user)
 
         mock_get_redis.reset_mock()
         mock_get_redis.return_value = 'token3'
@@ -75,21 +74,21 @@ class IgvAPITest(AuthenticationTestCase):
         mock_set_redis.assert_not_called()
         mock_subprocess.assert_not_called()
 
-    @mock.patch('seqr.utils.file_utils.subprocess.Popen')
     @mock.patch('seqr.utils.file_utils.open')
-    def test_proxy_local_to_igv(self, mock_open, mock_subprocess):
-        mock_subprocess.return_value.stdout = STREAMING_READS_CONTENT
-        mock_open.return_value.__enter__.return_value.__iter__.return_value = STREAMING_READS_CONTENT
+    def test_proxy_local_to_igv(self, mock_open):
+        mock_file = mock_open.return_value.__enter__.return_value
+        mock_file.read.return_value = b'\n'.join(STREAMING_READS_CONTENT)
+        mock_file.__iter__.return_value = STREAMING_READS_CONTENT
 
         url = reverse(fetch_igv_track, args=[PROJECT_GUID, '/project_A/sample_1.bam.bai'])
         self.check_collaborator_login(url)
         response = self.client.get(url, HTTP_RANGE='bytes=100-250')
         self.assertEqual(response.status_code, 206)
-        self.assertListEqual([val for val in response.streaming_content], STREAMING_READS_CONTENT)
-        mock_subprocess.assert_called_with(
-            'dd skip=100 count=150 bs=1 if=/project_A/sample_1.bai',
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-        mock_open.assert_not_called()
+        self.assertListEqual(
+            [val for val in response.streaming_content], [b'CRAM\x03\x83\n', b'\\\t\xfb\xa3\xf7%\x01\n', b'[\xfc\xc9\t\xae'])
+        mock_open.assert_called_with('/project_A/sample_1.bai', 'rb')
+        mock_file.seek.assert_called_with(100)
+        mock_file.read.assert_called_with(150)
 
         # test no byte range
         response = self.client.get(url)
@@ -132,9 +131,10 @@ class IgvAPITest(AuthenticationTestCase):
         response = self.client.post(url, data={'f': f})
         self.assertEqual(response.status_code, 200)
 
-    @mock.patch('seqr.utils.file_utils.subprocess.Popen')
+    @mock.patch('seqr.utils.file_utils._get_google_storage_client')
     @mock.patch('seqr.utils.file_utils.os.path.isfile')
-    def test_add_alignment_sample(self, mock_local_file_exists, mock_subprocess):
+    def test_add_alignment_sample(self, mock_local_file_exists, mock_storage_client):
+        mock_bucket = mock_storage_client.return_value.bucket
         url = reverse(update_individual_igv_sample, args=['I000001_na19675'])
         self.check_pm_login(url)
 
@@ -152,7 +152,7 @@ class IgvAPITest(AuthenticationTestCase):
             'Invalid file extension for "invalid_path.txt" - valid extensions are bam, cram, bigWig, junctions.bed.gz, bed.gz')
 
         mock_local_file_exists.return_value = False
-        mock_subprocess.return_value.wait.return_value = 1
+        mock_bucket.return_value.blob.return_value.exists.return_value = False
         response = self.client.post(url, content_type='application/json', data=json.dumps({
             'filePath': '/readviz/NA19675_new.cram',
         }))
@@ -167,7 +167,7 @@ class IgvAPITest(AuthenticationTestCase):
 
         # Send valid request
         mock_local_file_exists.return_value = True
-        mock_subprocess.return_value.wait.return_value = 0
+        mock_bucket.return_value.blob.return_value.exists.return_value = True
         response = self.client.post(url, content_type='application/json', data=json.dumps({
             'filePath': '/readviz/NA19675.new.cram',
         }))
@@ -194,7 +194,8 @@ class IgvAPITest(AuthenticationTestCase):
             set(response_json['individualsByGuid']['I000001_na19675']['igvSampleGuids']),
             {'S000145_na19675', sample_guid}
         )
-        mock_subprocess.assert_called_with('gsutil ls gs://readviz/batch_10.dcr.bed.gz', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+        mock_bucket.assert_called_with('readviz', user_project=None)
+        mock_bucket.return_value.blob.assert_called_with('batch_10.dcr.bed.gz')
 
         response = self.client.post(url, content_type='application/json', data=json.dumps({
             'filePath': 'gs://readviz/batch_10.junctions.bed.gz', 'sampleId': 'NA19675',
@@ -228,7 +229,7 @@ class IgvAPITest(AuthenticationTestCase):
 
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertDictEqual(json.loads(response.content), expected_body)
+        self.assertDictEqual(json.loads(b''.join(response.streaming_content)), expected_body)
         self.assertIsNone(responses.calls[0].request.headers.get('Range'))
 
         # test with range header proxy
@@ -239,5 +240,5 @@ class IgvAPITest(AuthenticationTestCase):
 
         response = self.client.get(url, HTTP_RANGE='bytes=100-200')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.decode(), expected_content)
+        self.assertEqual(b''.join(response.streaming_content).decode(), expected_content)
         self.assertEqual(responses.calls[1].request.headers.get('Range'), 'bytes=100-200')
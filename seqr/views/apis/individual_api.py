@@ -7,10 +7,12 @@ from collections import defaultdict
 from datetime import datetime
 from django.contrib.auth.models import User
 from django.db.models import prefetch_related_objects
+from django.utils import timezone
 
 from reference_data.models import HumanPhenotypeOntology
 from seqr.models import Individual, Family, Sample, RnaSeqOutlier
 from seqr.utils.gene_utils import get_genes
+from seqr.utils.logging_utils import SeqrLogger, log_model_bulk_update
 from seqr.views.utils.file_utils import save_uploaded_file, load_uploaded_file
 from seqr.views.utils.json_to_orm_utils import update_individual_from_json, update_model_from_json
 from seqr.views.utils.json_utils import create_json_response
@@ -23,6 +25,10 @@ from seqr.views.utils.individual_utils import delete_individuals, get_parsed_fea
     get_updated_pedigree_json
 
 
+logger = SeqrLogger(__name__)
+
+BULK_UPDATE_BATCH_SIZE = 500
+
 _SEX_TO_EXPORTED_VALUE = dict(Individual.SEX_LOOKUP)
 _SEX_TO_EXPORTED_VALUE['U'] = ''
 
@@ -498,6 +504,12 @@ def receive_individuals_metadata_handler(request, project_guid):
     return create_json_response(response)
 
 
+HPO_PRESENT_HEADER_REGEX = re.compile('hpo.*present')
+HPO_ABSENT_HEADER_REGEX = re.compile('hpo.*absent')
+HPO_NUMBER_HEADER_REGEX = re.compile('hp.*number*')
+HPO_TERM_DESCRIPTION_REGEX = re.compile(r'\(.*?\)')
+
+
 def _process_hpo_records(records, filename, project, user):
     if filename.endswith('.json'):
         row_dicts = [_parse_phenotips_record(record) for record in records]
@@ -505,11 +517,11 @@ def _process_hpo_records(records, filename, project, user):
         column_map = {}
         for i, field in enumerate(records[0]):
             key = field.lower()
-            if re.match("hpo.*present", key):
+            if HPO_PRESENT_HEADER_REGEX.match(key):
                 column_map[FEATURES_COL] = i
-            elif re.match("hpo.*absent", key):
+            elif HPO_ABSENT_HEADER_REGEX.match(key):
                 column_map[ABSENT_FEATURES_COL] = i
-            elif re.match("hp.*number*", key):
+            elif HPO_NUMBER_HEADER_REGEX.match(key):
                 if not HPO_TERM_NUMBER_COL in column_map:
                     column_map[HPO_TERM_NUMBER_COL] = []
                 column_map[HPO_TERM_NUMBER_COL].append(i)
@@ -561,7 +573,7 @@ def _process_hpo_records(records, filename, project, user):
 def _parse_hpo_terms(hpo_term_string):
     if not hpo_term_string:
         return []
-    return [hpo_term.strip() for hpo_term in re.sub(r'\(.*?\)', '', hpo_term_string).replace(',', ';').split(';')]
+    return [hpo_term.strip() for hpo_term in HPO_TERM_DESCRIPTION_REGEX.sub('', hpo_term_string).replace(',', ';').split(';')]
 
 
 def _has_same_features(individual, present_features, absent_features):
@@ -580,7 +592,7 @@ def _parse_individual_hpo_terms(json_records, project, user):
     individual_ids += ['{}_{}'.format(record[FAMILY_ID_COL], record[INDIVIDUAL_ID_COL])
                        for record in json_records if FAMILY_ID_COL in record]
     individual_lookup = defaultdict(dict)
-    for i in Individual.objects.filter(family__project=project, individual_id__in=individual_ids).prefetch_related('family'):
+    for i in Individual.objects.filter(family__project=project, individual_id__in=individual_ids).select_related('family'):
         individual_lookup[i.individual_id][i.family.family_id] = i
 
     allowed_assigned_analysts = None
@@ -704,6 +716,38 @@ def _get_metadata_warnings(invalid_hpo_term_individuals, invalid_values, missing
     return warnings
 
 
+def _bulk_update_individuals_metadata(json_records, individuals_by_guid, user):
+    """Applies the metadata fields from the parsed records, with one bulk update per distinct set of changed fields
+
+    Returns:
+        dict: mapping of assigned analyst email to the ids of the families to assign to that analyst
+    """
+    updated_individuals_by_fields = defaultdict(list)
+    family_assigned_analysts = defaultdict(list)
+    for record in json_records:
+        individual = individuals_by_guid[record[INDIVIDUAL_GUID_COL]]
+        updated_fields = tuple(sorted(
+            k for k in INDIVIDUAL_METADATA_FIELDS.keys() if k in record and getattr(individual, k) != record[k]
+        ))
+        if updated_fields:
+            for k in updated_fields:
+                setattr(individual, k, record[k])
+            updated_individuals_by_fields[updated_fields].append(individual)
+        if record.get(ASSIGNED_ANALYST_COL):
+            family_assigned_analysts[record[ASSIGNED_ANALYST_COL]].append(individual.family.id)
+
+    # bulk_update bypasses save, so the modified date is set explicitly
+    last_modified_date = timezone.now()
+    for updated_fields, updated_individuals in updated_individuals_by_fields.items():
+        for individual in updated_individuals:
+            individual.last_modified_date = last_modified_date
+        Individual.objects.bulk_update(
+            updated_individuals, list(updated_fields) + ['last_modified_date'], batch_size=BULK_UPDATE_BATCH_SIZE)
+        log_model_bulk_update(logger, updated_individuals, user, 'update', update_fields=list(updated_fields))
+
+    return family_assigned_analysts
+
+
 @login_and_policies_required
 def save_individuals_metadata_table_handler(request, project_guid, upload_file_id):
     """
@@ -719,14 +763,7 @@ def save_individuals_metadata_table_handler(request, project_guid, upload_file_i
 
     if any(ASSIGNED_ANALYST_COL in record for record in json_records):
         prefetch_related_objects(individuals, 'family')
-    family_assigned_analysts = defaultdict(list)
-
-    for record in json_records:
-        individual = individuals_by_guid[record[INDIVIDUAL_GUID_COL]]
-        update_model_from_json(
-            individual, {k: record[k] for k in INDIVIDUAL_METADATA_FIELDS.keys() if k in record}, user=request.user)
-        if record.get(ASSIGNED_ANALYST_COL):
-            family_assigned_analysts[record[ASSIGNED_ANALYST_COL]].append(individual.family.id)
+    family_assigned_analysts = _bulk_update_individuals_metadata(json_records, individuals_by_guid, request.user)
 
     response = {
         'individualsByGuid': {
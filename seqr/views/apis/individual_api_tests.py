@@ -518,6 +518,37 @@ class IndividualAPITest(AuthenticationTestCase):
         response = self.client.post(url, data={'f': f})
         self._is_expected_individuals_metadata_upload(response)
 
+    @mock.patch('seqr.views.apis.individual_api.logger')
+    @mock.patch('seqr.views.apis.individual_api.load_uploaded_file')
+    def test_save_individuals_metadata_bulk_update(self, mock_load_uploaded_file, mock_logger):
+        url = reverse(save_individuals_metadata_table_handler, args=[PROJECT_GUID, 'updates.json'])
+        self.check_collaborator_login(url)
+
+        mock_load_uploaded_file.return_value = ([
+            {'individual_guid': 'I000001_na19675', 'birth_year': 2000, 'notes': 'new note'},
+            {'individual_guid': 'I000002_na19678', 'birth_year': None, 'notes': 'new note'},
+            {'individual_guid': 'I000003_na19679', 'notes': 'another note', 'birth_year': 2001},
+        ], {})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['individualsByGuid']), 3)
+
+        self.assertListEqual(
+            list(Individual.objects.filter(guid__in=['I000001_na19675', 'I000002_na19678', 'I000003_na19679']).order_by(
+                'guid').values_list('birth_year', 'notes')),
+            [(2000, 'new note'), (None, 'new note'), (2001, 'another note')],
+        )
+        mock_logger.info.assert_has_calls([
+            mock.call('update 2 Individuals', self.collaborator_user, db_update={
+                'dbEntity': 'Individual', 'entityIds': ['I000001_na19675', 'I000003_na19679'],
+                'updateType': 'bulk_update', 'updateFields': ['birth_year', 'notes'],
+            }),
+            mock.call('update 1 Individuals', self.collaborator_user, db_update={
+                'dbEntity': 'Individual', 'entityIds': ['I000002_na19678'], 'updateType': 'bulk_update',
+                'updateFields': ['notes'],
+            }),
+        ])
+
     def test_get_hpo_terms(self):
         url = reverse(get_hpo_terms, args=['HP:0011458'])
         self.check_require_login(url)
@@ -136,26 +136,27 @@ def match_sample_ids_to_sample_records(
     remaining_sample_ids = set(sample_ids) - {sample.sample_id for sample in samples}
     matched_individual_ids = {sample.individual_id for sample in samples}
     if len(remaining_sample_ids) > 0:
+        remaining_sample_individual_ids = {
+            sample_id: (sample_id_to_individual_id_mapping or {}).get(sample_id, sample_id)
+            for sample_id in remaining_sample_ids
+        }
         remaining_individuals_dict = {
-            i.individual_id: i for i in
-            Individual.objects.filter(family__project__in=projects).exclude(id__in=matched_individual_ids)
+            i.individual_id: i for i in Individual.objects.filter(
+                family__project__in=projects, individual_id__in=set(remaining_sample_individual_ids.values()),
+            ).exclude(id__in=matched_individual_ids)
         }
 
         # find Individual records with exactly-matching individual_ids
         sample_id_to_individual_record = {}
-        for sample_id in remaining_sample_ids:
-            individual_id = sample_id
-            if sample_id_to_individual_id_mapping and sample_id in sample_id_to_individual_id_mapping:
-                individual_id = sample_id_to_individual_id_mapping[sample_id]
-
-            if individual_id not in remaining_individuals_dict:
+        for sample_id, individual_id in remaining_sample_individual_ids.items():
+            individual = remaining_individuals_dict.pop(individual_id, None)
+            if not individual:
                 continue
-            sample_id_to_individual_record[sample_id] = remaining_individuals_dict[individual_id]
-            del remaining_individuals_dict[individual_id]
+            sample_id_to_individual_record[sample_id] = individual
+            remaining_sample_ids.discard(sample_id)
 
         logger.debug(str(len(sample_id_to_individual_record)) + " matched individual ids", user)
 
-        remaining_sample_ids -= set(sample_id_to_individual_record.keys())
         if raise_no_match_error and len(remaining_sample_ids) == len(sample_ids):
             raise ValueError(
                 'None of the individuals or samples in the project matched the {} expected sample id(s)'.format(
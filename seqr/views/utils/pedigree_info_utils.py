@@ -1,5 +1,6 @@
 """Utilities for parsing .fam files or other tables that describe individual pedigree structure."""
 import difflib
+from functools import lru_cache
 import os
 import json
 import tempfile
@@ -17,6 +18,13 @@ logger = SeqrLogger(__name__)
 
 
 RELATIONSHIP_REVERSE_LOOKUP = {v.lower(): k for k, v in Individual.RELATIONSHIP_LOOKUP.items()}
+TISSUE_AFFECTED_STATUS_LOOKUP = {'Yes': True, 'No': False}
+BIOSAMPLE_REVERSE_LOOKUP = {uberon_code: code for code, uberon_code in Individual.BIOSAMPLE_CHOICES}
+BIOSAMPLE_CODE_LENGTHS = sorted({len(uberon_code) for uberon_code in BIOSAMPLE_REVERSE_LOOKUP}, reverse=True)
+INVALID_SEX_RELATIONSHIP_CHOICES = {
+    Individual.SEX_MALE: Individual.FEMALE_RELATIONSHIP_CHOICES,
+    Individual.SEX_FEMALE: Individual.MALE_RELATIONSHIP_CHOICES,
+}
 
 
 def parse_pedigree_table(parsed_file, filename, user, project=None, fail_on_warnings=False):
@@ -62,8 +70,8 @@ def parse_pedigree_table(parsed_file, filename, user, project=None, fail_on_warn
             if expected == actual:
                 expected = expected_header_columns[4:6]
                 actual = headers[1][4:6]
-            unexpected_header_columns = '|'.join(difflib.unified_diff(expected, actual)).split('\n')[3:]
-            if unexpected_header_columns:
+            if expected != actual:
+                unexpected_header_columns = '|'.join(difflib.unified_diff(expected, actual)).split('\n')[3:]
                 raise ValueError("Expected vs. actual header columns: {}".format("\t".join(unexpected_header_columns)))
 
             header = expected_header_columns
@@ -77,13 +85,7 @@ def parse_pedigree_table(parsed_file, filename, user, project=None, fail_on_warn
                 )
             header = [(field or '').strip('#') for field in header_row]
 
-        for i, row in enumerate(rows):
-            if len(row) != len(header):
-                raise ValueError("Row {} contains {} columns: {}, while header contains {}: {}".format(
-                    i + 1, len(row), ', '.join(row), len(header), ', '.join(header)
-                ))
-
-        rows = [dict(zip(header, row)) for row in rows]
+        rows = [_get_row_dict(header, row, i) for i, row in enumerate(rows)]
     except Exception as e:
         raise ErrorsWarningsException(['Error while parsing file: {}. {}'.format(filename, e)], [])
 
@@ -110,23 +112,40 @@ def parse_pedigree_table(parsed_file, filename, user, project=None, fail_on_warn
     return json_records, warnings
 
 
+def _get_row_dict(header, row, i):
+    if len(row) != len(header):
+        raise ValueError("Row {} contains {} columns: {}, while header contains {}: {}".format(
+            i + 1, len(row), ', '.join(row), len(header), ', '.join(header)
+        ))
+    return dict(zip(header, row))
+
+
+SEX_PREFIX_LOOKUP = {'M': 'M', 'F': 'F'}
+SEX_VALUE_LOOKUP = {'1': 'M', '2': 'F', '0': 'U', '': 'U', 'unknown': 'U', 'prefer_not_answer': 'U'}
+AFFECTED_VALUE_LOOKUP = {'1': 'N', 'u': 'N', 'unaffected': 'N', '2': 'A', '0': 'U', '': 'U', 'unknown': 'U'}
+
+
 def _parse_sex(sex):
-    if sex == '1' or sex.upper().startswith('M'):
-        return 'M'
-    elif sex == '2' or sex.upper().startswith('F'):
-        return 'F'
-    elif sex == '0' or not sex or sex.lower() in {'unknown', 'prefer_not_answer'}:
-        return 'U'
-    return None
+    return SEX_PREFIX_LOOKUP.get(sex[:1].upper()) or SEX_VALUE_LOOKUP.get(sex.lower())
 
 
 def _parse_affected(affected):
-    if affected == '1' or affected.upper() == "U" or affected.lower() == 'unaffected':
-        return 'N'
-    elif affected == '2' or affected.upper().startswith('A'):
-        return 'A'
-    elif affected == '0' or not affected or affected.lower() == 'unknown':
-        return 'U'
+    return AFFECTED_VALUE_LOOKUP.get(affected.lower()) or ('A' if affected[:1].upper() == 'A' else None)
+
+
+def _parse_parent_id(parent_id):
+    return parent_id if parent_id != '.' else ''
+
+
+def _parse_proband_relationship(relationship):
+    return RELATIONSHIP_REVERSE_LOOKUP.get(relationship.lower())
+
+
+def _parse_primary_biosample(biosample):
+    for code_length in BIOSAMPLE_CODE_LENGTHS:
+        code = BIOSAMPLE_REVERSE_LOOKUP.get(biosample[:code_length])
+        if code:
+            return code
     return None
 
 
@@ -173,30 +192,53 @@ def _convert_fam_file_rows_to_json(rows):
     return json_results
 
 
+def _get_column(full_key):
+    key = full_key.lower()
+    if full_key in JsonConstants.JSON_COLUMNS:
+        return full_key
+    elif key == JsonConstants.FAMILY_NOTES_COLUMN.lower():
+        return JsonConstants.FAMILY_NOTES_COLUMN
+    elif key.startswith("notes"):
+        return JsonConstants.NOTES_COLUMN
+    return next((
+        col for col, substrings in JsonConstants.COLUMN_SUBSTRINGS
+        if all(substring in key for substring in substrings)
+    ), None)
+
+
+# headers come from user uploaded files, so the cache is bounded to keep it from growing in long running web workers
+COLUMN_PARSER_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=COLUMN_PARSER_CACHE_SIZE)
+def _get_column_parser(full_key):
+    """Resolves a raw header to its json column and formatting rules. Headers are shared by every row in a file, so
+    this is cached rather than recomputed for each cell
+
+    Returns:
+        tuple: (column, format_func, format_empty_values, allow_invalid_values), or None for unrecognized headers
+    """
+    column = _get_column(full_key)
+    if not column:
+        return None
+    return (
+        column,
+        JsonConstants.FORMAT_COLUMNS.get(column),
+        column in JsonConstants.FORMAT_EMPTY_VALUE_COLUMNS,
+        column in JsonConstants.JSON_COLUMNS,
+    )
+
+
 def _parse_row_dict(row_dict, i):
     json_record = {}
     for key, value in row_dict.items():
-        full_key = key
-        key = key.lower()
-        value = (value or '').strip()
-
-        if full_key in JsonConstants.JSON_COLUMNS:
-            column = full_key
-        elif key == JsonConstants.FAMILY_NOTES_COLUMN.lower():
-            column = JsonConstants.FAMILY_NOTES_COLUMN
-        elif key.startswith("notes"):
-            column = JsonConstants.NOTES_COLUMN
-        else:
-            column = next((
-                col for col, substrings in JsonConstants.COLUMN_SUBSTRINGS
-                if all(substring in key for substring in substrings)
-            ), None)
-
-        if column:
-            format_func = JsonConstants.FORMAT_COLUMNS.get(column)
-            if format_func and (value or column in {JsonConstants.SEX_COLUMN, JsonConstants.AFFECTED_COLUMN}):
+        column_parser = _get_column_parser(key)
+        if column_parser:
+            column, format_func, format_empty_values, allow_invalid_values = column_parser
+            value = (value or '').strip()
+            if format_func and (value or format_empty_values):
                 parsed_value = format_func(value)
-                if parsed_value is None and column not in JsonConstants.JSON_COLUMNS:
+                if parsed_value is None and not allow_invalid_values:
                     raise ValueError(f'Invalid value "{value}" for {_to_snake_case(column)} in row #{i + 1}')
                 value = parsed_value
             json_record[column] = value
@@ -226,21 +268,17 @@ def validate_fam_file_records(records, fail_on_warnings=False):
     for r in records:
         individual_id = r[JsonConstants.INDIVIDUAL_ID_COLUMN]
         family_id = r.get(JsonConstants.FAMILY_ID_COLUMN) or r['family']['familyId']
+        sex = r.get(JsonConstants.SEX_COLUMN)
+        relationship = r.get(JsonConstants.PROBAND_RELATIONSHIP)
 
         # check proband relationship has valid gender
-        if r.get(JsonConstants.PROBAND_RELATIONSHIP) and r.get(JsonConstants.SEX_COLUMN):
-            invalid_choices = {}
-            if r[JsonConstants.SEX_COLUMN] == Individual.SEX_MALE:
-                invalid_choices = Individual.FEMALE_RELATIONSHIP_CHOICES
-            elif r[JsonConstants.SEX_COLUMN] == Individual.SEX_FEMALE:
-                invalid_choices = Individual.MALE_RELATIONSHIP_CHOICES
-            if invalid_choices and r[JsonConstants.PROBAND_RELATIONSHIP] in invalid_choices:
-                errors.append(
-                    'Invalid proband relationship "{relationship}" for {individual_id} with given gender {sex}'.format(
-                        relationship=Individual.RELATIONSHIP_LOOKUP[r[JsonConstants.PROBAND_RELATIONSHIP]],
-                        individual_id=individual_id,
-                        sex=dict(Individual.SEX_CHOICES)[r[JsonConstants.SEX_COLUMN]]
-                    ))
+        if relationship and relationship in INVALID_SEX_RELATIONSHIP_CHOICES.get(sex, {}):
+            errors.append(
+                'Invalid proband relationship "{relationship}" for {individual_id} with given gender {sex}'.format(
+                    relationship=Individual.RELATIONSHIP_LOOKUP[relationship],
+                    individual_id=individual_id,
+                    sex=Individual.SEX_LOOKUP[sex]
+                ))
 
         # check maternal and paternal ids for consistency
         for parent_id_type, parent_id, expected_sex in [
@@ -251,8 +289,9 @@ def validate_fam_file_records(records, fail_on_warnings=False):
                 continue
 
             # is there a separate record for the parent id?
-            if parent_id not in records_by_id:
-                warnings.append("%(parent_id)s is the %(parent_id_type)s of %(individual_id)s but doesn't have a separate record in the table" % locals())
+            parent = records_by_id.get(parent_id)
+            if parent is None:
+                warnings.append(f"{parent_id} is the {parent_id_type} of {individual_id} but doesn't have a separate record in the table")
                 continue
 
             # is the parent the same individuals
@@ -260,17 +299,15 @@ def validate_fam_file_records(records, fail_on_warnings=False):
                 errors.append('{} is recorded as their own {}'.format(parent_id, parent_id_type))
 
             # is father male and mother female?
-            if JsonConstants.SEX_COLUMN in records_by_id[parent_id]:
-                actual_sex = records_by_id[parent_id][JsonConstants.SEX_COLUMN]
-                if actual_sex != expected_sex:
-                    actual_sex_label = dict(Individual.SEX_CHOICES)[actual_sex]
-                    errors.append("%(parent_id)s is recorded as %(actual_sex_label)s and also as the %(parent_id_type)s of %(individual_id)s" % locals())
+            actual_sex = parent.get(JsonConstants.SEX_COLUMN, expected_sex)
+            if actual_sex != expected_sex:
+                actual_sex_label = Individual.SEX_LOOKUP[actual_sex]
+                errors.append(f"{parent_id} is recorded as {actual_sex_label} and also as the {parent_id_type} of {individual_id}")
 
             # is the parent in the same family?
-            parent = records_by_id[parent_id]
             parent_family_id = parent.get(JsonConstants.FAMILY_ID_COLUMN) or parent['family']['familyId']
             if parent_family_id != family_id:
-                errors.append("%(parent_id)s is recorded as the %(parent_id_type)s of %(individual_id)s but they have different family ids: %(parent_family_id)s and %(family_id)s" % locals())
+                errors.append(f"{parent_id} is recorded as the {parent_id_type} of {individual_id} but they have different family ids: {parent_family_id} and {family_id}")
 
     if fail_on_warnings:
         errors += warnings
@@ -670,18 +707,18 @@ class JsonConstants:
     ANALYTE_TYPE = 'analyteType'
     TISSUE_AFFECTED_STATUS = 'tissueAffectedStatus'
 
-    JSON_COLUMNS = {MATERNAL_ETHNICITY, PATERNAL_ETHNICITY, BIRTH_YEAR, DEATH_YEAR, ONSET_AGE, AFFECTED_RELATIVES}
+    JSON_COLUMNS = frozenset({MATERNAL_ETHNICITY, PATERNAL_ETHNICITY, BIRTH_YEAR, DEATH_YEAR, ONSET_AGE, AFFECTED_RELATIVES})
+    FORMAT_EMPTY_VALUE_COLUMNS = frozenset({SEX_COLUMN, AFFECTED_COLUMN})
 
     FORMAT_COLUMNS = {
         SEX_COLUMN: _parse_sex,
         AFFECTED_COLUMN: _parse_affected,
-        PATERNAL_ID_COLUMN: lambda value: value if value != '.' else '',
-        MATERNAL_ID_COLUMN: lambda value: value if value != '.' else '',
-        PROBAND_RELATIONSHIP: lambda value: RELATIONSHIP_REVERSE_LOOKUP.get(value.lower()),
-        PRIMARY_BIOSAMPLE: lambda value: next(
-            (code for code, uberon_code in Individual.BIOSAMPLE_CHOICES if value.startswith(uberon_code)), None),
+        PATERNAL_ID_COLUMN: _parse_parent_id,
+        MATERNAL_ID_COLUMN: _parse_parent_id,
+        PROBAND_RELATIONSHIP: _parse_proband_relationship,
+        PRIMARY_BIOSAMPLE: _parse_primary_biosample,
         ANALYTE_TYPE: Individual.ANALYTE_REVERSE_LOOKUP.get,
-        TISSUE_AFFECTED_STATUS: {'Yes': True, 'No': False}.get,
+        TISSUE_AFFECTED_STATUS: TISSUE_AFFECTED_STATUS_LOOKUP.get,
     }
     FORMAT_COLUMNS.update({col: json.loads for col in JSON_COLUMNS})
 